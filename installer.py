@@ -1,17 +1,40 @@
 # PyHx/installer.py
 
 import os
+import sys
 import getpass
 import json
 import hashlib
 import shutil
 import textwrap
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+import zipapp
+import py_compile
 
 # --- Helper Functions (self-contained for the installer) ---
 CONFIG_DIR = "config"
 USERS_FILE = os.path.join(CONFIG_DIR, "users.json")
 HOSTNAME_FILE = os.path.join(CONFIG_DIR, "hostname.txt")
 
+# --- Bundle Settings ---
+BUNDLE_NAME = "pyhx.pyz"
+BUNDLE_SOURCES = ["main.py", "tools", "store"]   # Main shell, converter and tools, App Store
+BUNDLE_INTERPRETER = "/usr/bin/env python3"
+BUNDLE_OPTIMIZE = 2      # Same as 'python -OO': no asserts or docstrings in the bytecode
+BENCHMARK_RUNS = 5
+# The shell imports its tool modules on first use, so '--help' alone doesn't load them
+BENCHMARK_TOOLS = ("import sys; sys.path[0] = {path!r}; "
+                   "import main; from tools import pyhx_calc, pyhx_converter, pyhx_index, pyhx_usage")
+BUNDLE_MAIN = """\
+# Entry point of the PyHx bundle; data directories stay outside the archive.
+import main
+main.cli()
+"""
+
 def hash_password(password):
     """Hashes a password using SHA-256."""
     return hashlib.sha256(password.encode('utf-8')).hexdigest()
@@ -35,7 +58,7 @@ def clear_screen():
 # --- Dockerfile Generation ---
 def create_docker_files():
     """Generates the Dockerfile and other necessary files for a portable environment."""
-    
+
     dockerfile_content = """
 # Use an official Python runtime as a parent image
 FROM python:3.12-slim
@@ -55,7 +78,7 @@ COPY . .
 # Command to run on container start
 CMD ["python", "main.py"]
 """
-    
+
     readme_content = """
 # PyHx OS - Portable Docker Environment
 
@@ -70,3 +93,171 @@ This package contains everything needed to run PyHx OS in an isolated Docker con
 2. Build the Docker image by running:
    ```bash
    docker build -t pyhx-os .
+   ```
+3. Start PyHx OS in an interactive container:
+   ```bash
+   docker run -it --rm pyhx-os
+   ```
+
+Users, packages and installed apps live inside the container and are reset
+when it is removed. Mount a volume on `/pyhx-os/config` and
+`/pyhx-os/packages` to keep them.
+"""
+
+    with open("Dockerfile", 'w', encoding='utf-8') as f:
+        f.write(dockerfile_content.lstrip())
+    with open("DOCKER_README.md", 'w', encoding='utf-8') as f:
+        f.write(readme_content.lstrip())
+    print("Created 'Dockerfile' and 'DOCKER_README.md'.")
+
+# --- Bundle Generation ---
+def _bundle_files(source_dir):
+    """Yields (source path, path inside the archive) for every module that goes into the bundle."""
+    for name in BUNDLE_SOURCES:
+        path = os.path.join(source_dir, name)
+        if os.path.isfile(path):
+            yield path, name
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if d != '__pycache__']
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    full_path = os.path.join(dirpath, filename)
+                    yield full_path, os.path.relpath(full_path, source_dir)
+
+def build_bundle(source_dir, output, optimize=BUNDLE_OPTIMIZE):
+    """
+    Builds a single-file zipapp of PyHx with precompiled bytecode.
+
+    Each module is stored as source plus a legacy 'module.pyc' beside it,
+    which zipimport loads without compiling. The .pyc files are unchecked
+    hash-based (PEP 552), so they stay valid no matter what timestamps the
+    archive gets when copied between hosts. On a different Python version
+    the bytecode is rejected and the sources are used instead.
+    """
+    output = os.path.abspath(output)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with tempfile.TemporaryDirectory() as staging:
+        count = 0
+        for source_path, arcname in _bundle_files(source_dir):
+            target = os.path.join(staging, arcname)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source_path, target)
+            py_compile.compile(source_path, cfile=target + 'c', dfile=os.path.join(output, arcname),
+                               doraise=True, optimize=optimize,
+                               invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+            count += 1
+        main_path = os.path.join(staging, '__main__.py')
+        with open(main_path, 'w', encoding='utf-8') as f:
+            f.write(BUNDLE_MAIN)
+        py_compile.compile(main_path, cfile=main_path + 'c', doraise=True, optimize=optimize,
+                           invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        zipapp.create_archive(staging, output, interpreter=BUNDLE_INTERPRETER, compressed=True)
+    print(f"Built '{output}' ({count} modules, {os.path.getsize(output) / 1024:.0f} KB, "
+          f"Python {sys.version_info.major}.{sys.version_info.minor} bytecode).")
+    return output
+
+def _startup_time(command, runs, env=None, fresh_cache=False):
+    """Median wall time, in milliseconds, of running a command to completion."""
+    times = []
+    for _ in range(runs):
+        run_env = dict(env or os.environ)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            if fresh_cache:
+                run_env['PYTHONPYCACHEPREFIX'] = cache_dir  # No cached bytecode: every module compiles
+            start = time.perf_counter()
+            subprocess.run(command, env=run_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def benchmark_startup(source_dir, bundle, runs=BENCHMARK_RUNS):
+    """
+    Prints how long PyHx takes to start from loose sources and from the
+    bundle: up to the shell ('--help', which exits before touching any
+    data), and with every tool module imported as well.
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    main_script = os.path.join(source_dir, 'main.py')
+    baseline = _startup_time([sys.executable, '-c', 'pass'], runs, env)
+    print(f"Startup time (median of {runs} runs, interpreter alone {baseline:.0f} ms):")
+    print(f"  {'':<34} {'shell':>10} {'all tools':>10}")
+    for label, script, path, fresh_cache in [
+        ("Loose sources, no bytecode cache", main_script, source_dir, True),
+        ("Loose sources, cached bytecode", main_script, source_dir, False),
+        ("Bundle", bundle, bundle, False),
+    ]:
+        shell_ms = _startup_time([sys.executable, script, '--help'], runs, env, fresh_cache)
+        tools_ms = _startup_time([sys.executable, '-c', BENCHMARK_TOOLS.format(path=path)], runs, env, fresh_cache)
+        print(f"  {label:<34} {shell_ms:7.1f} ms {tools_ms:7.1f} ms")
+
+# --- Setup Wizard ---
+def setup_wizard():
+    """Asks for the hostname and an administrator account, then writes the config files."""
+    clear_screen()
+    print("--- PyHx OS Installer ---\n")
+    if os.path.exists(USERS_FILE):
+        answer = input("PyHx OS is already set up here. Overwrite users and hostname? (y/n): ").lower()
+        if answer != 'y':
+            print("Setup cancelled.")
+            return
+    hostname = input("Enter a hostname for this system (default: pyhx-host): ").strip() or "pyhx-host"
+    while True:
+        username = input("Enter a username for the administrator: ").strip()
+        if username:
+            break
+        print("Username cannot be empty.")
+    while True:
+        password = getpass.getpass("Enter a password: ")
+        if not password:
+            print("Password cannot be empty.")
+        elif password != getpass.getpass("Confirm password: "):
+            print("Passwords do not match. Try again.")
+        else:
+            break
+    save_hostname(hostname)
+    save_users({username: {"password": hash_password(password), "role": "admin"}})
+    os.makedirs(os.path.join("packages", "installed"), exist_ok=True)
+    print(f"\nCreated administrator '{username}' on '{hostname}'.")
+
+    if input("Create Docker files for a portable environment? (y/n): ").lower() == 'y':
+        create_docker_files()
+
+    print(textwrap.dedent("""
+        Setup complete! Start PyHx OS with:
+            python main.py
+        or build a single-file bundle for other hosts with:
+            python installer.py --bundle
+    """))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sets up PyHx OS, or builds it as a single-file bundle.")
+    parser.add_argument('--bundle', action='store_true', help=f"Build a zipapp ({BUNDLE_NAME}) instead of running setup.")
+    parser.add_argument('--output', default=BUNDLE_NAME, help=f"Where to write the bundle (default {BUNDLE_NAME}).")
+    parser.add_argument('--optimize', type=int, choices=[0, 1, 2], default=BUNDLE_OPTIMIZE,
+                        help=f"Bytecode optimization level (default {BUNDLE_OPTIMIZE}).")
+    parser.add_argument('--no-benchmark', action='store_true', help="Skip the startup time comparison.")
+    parser.add_argument('--data-dir', help="Folder to write config/ and packages/ to during setup "
+                                           "(default: next to the installer).")
+    options = parser.parse_args()
+    source_dir = os.path.dirname(os.path.realpath(__file__))
+
+    if options.bundle:
+        output = build_bundle(source_dir, options.output, options.optimize)
+        if not options.no_benchmark:
+            benchmark_startup(source_dir, output)
+        print(f"Copy '{os.path.basename(output)}' to a host and run it with 'python3 {os.path.basename(output)}'.")
+        print("Data is kept next to the bundle, or in --data-dir / $PYHX_HOME.")
+        return
+
+    # Set working directory so config lands where PyHx looks for it
+    data_dir = options.data_dir or source_dir
+    os.makedirs(data_dir, exist_ok=True)
+    os.chdir(data_dir)
+    try:
+        setup_wizard()
+    except (KeyboardInterrupt, EOFError):
+        print("\nSetup cancelled.")
+
+if __name__ == "__main__":
+    main()
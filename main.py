@@ -16,19 +16,176 @@ import re
 import calendar
 import base64
 import binascii
+import zipfile
+import zlib
+import collections
+import argparse
+import functools
+import threading
+
+from tools import pyhx_audit
+from tools import pyhx_vfs
 
 # --- Global State ---
 COMMAND_HISTORY = []
+_CALC_VARS = {}
 
 # --- Configuration and Constants ---
-# Using local directories as per the restored design
+# Code is loaded from CODE_ROOT (the source folder, or the .pyz file when
+# bundled). Data lives in local directories relative to the data directory
+# the shell changes into at startup.
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HOME = CODE_ROOT if os.path.isdir(CODE_ROOT) else os.path.dirname(CODE_ROOT)
+HOME_ENV_VAR = "PYHX_HOME"
 CONFIG_DIR = "config"
 PACKAGES_DIR = "packages"
 INSTALLED_DIR = os.path.join(PACKAGES_DIR, "installed")
+ENVS_DIR = os.path.join(PACKAGES_DIR, "envs")
+WHEELS_DIR = os.path.join(PACKAGES_DIR, "wheels")
+MANIFEST_NAME = "pyhx.json"
+ENV_READY_FILE = ".pyhx-ready"
+ENV_CACHE_LIMIT = 8      # Unused app environments beyond this many are evicted
+VERIFIED_FILE = os.path.join(CONFIG_DIR, "verified.json")
+VERIFY_WORKERS = os.cpu_count() or 4
 HOSTNAME_FILE = os.path.join(CONFIG_DIR, "hostname.txt")
 USERS_FILE = os.path.join(CONFIG_DIR, "users.json")
+HOMES_DIR = os.path.join(CONFIG_DIR, "homes")
+INDEX_FILE = os.path.join(CONFIG_DIR, "index.db")
+USAGE_CACHE_FILE = os.path.join(CONFIG_DIR, "usage_cache.json")
+AUDIT_FILE = os.path.join(CONFIG_DIR, "audit.log")
 START_TIME = time.time()
 
+# --- Server Mode Settings ---
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_WORKERS = 64      # Threads shared by all sessions for running commands
+LOGIN_TIMEOUT = 120      # Seconds a client may idle at the login prompts
+PROMPT_TIMEOUT = 300     # Seconds a command may wait for an answer (e.g. a confirmation) while holding a worker
+INPUT_MARK = "\x1f"      # Sent after a prompt that expects a line of input
+SECRET_MARK = "\x1e"     # Sent after a prompt that expects a password
+
+# --- Session Context ---
+# In the local shell no session is bound and the helpers below fall back to the
+# process-wide cwd, stdin/stdout and COMMAND_HISTORY. In server mode each worker
+# thread binds the ServerSession it is running a command for.
+_SESSION = threading.local()
+_USERS_LOCK = threading.RLock()
+
+def current_session():
+    """Returns the server session bound to this thread, or None in the local shell."""
+    return getattr(_SESSION, 'active', None)
+
+def resolve_path(path):
+    """Resolves a user-supplied path against the current session's directory."""
+    session = current_session()
+    if session is None:
+        return path
+    return os.path.normpath(os.path.join(session.cwd, os.path.expanduser(path)))
+
+def current_history():
+    """Returns the command history list of the current session."""
+    session = current_session()
+    return session.history if session else COMMAND_HISTORY
+
+def prompt_input(prompt=""):
+    """Reads a line from the user, over the socket when serving a session."""
+    session = current_session()
+    if session is None:
+        return input(prompt)
+    return session.read_line(prompt)
+
+def prompt_password(prompt="Password: "):
+    """Reads a password without echo, over the socket when serving a session."""
+    session = current_session()
+    if session is None:
+        return getpass.getpass(prompt)
+    return session.read_line(prompt, secret=True)
+
+def run_process(command, check=False, **kwargs):
+    """Runs an external program, streaming its output to the session when serving."""
+    if current_session() is None:
+        return subprocess.run(command, check=check, **kwargs)
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, errors='replace', **kwargs)
+    for line in process.stdout:
+        print(line, end='')
+    process.wait()
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return subprocess.CompletedProcess(command, process.returncode)
+
+# --- Filesystem Backends ---
+_FILESYSTEMS = {}
+
+class HostFS(pyhx_vfs.FileSystem):
+    """Backend that acts directly on the host filesystem, relative to the session directory."""
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def _path(self, path):
+        if self.session is None:
+            return path
+        return os.path.normpath(os.path.join(self.session.cwd, os.path.expanduser(path)))
+
+    def getcwd(self):
+        return self.session.cwd if self.session else os.getcwd()
+
+    def chdir(self, path):
+        if self.session is None:
+            os.chdir(path)
+            return
+        target = self._path(path)
+        if not os.path.isdir(target):
+            raise FileNotFoundError(target)
+        self.session.cwd = target
+
+    def entries(self, path):
+        with os.scandir(self._path(path)) as it:
+            return [(entry.name, entry.is_dir()) for entry in it]
+
+    def isdir(self, path):
+        return os.path.isdir(self._path(path))
+
+    def exists(self, path):
+        return os.path.exists(self._path(path))
+
+    def makedirs(self, path):
+        os.makedirs(self._path(path))
+
+    def touch(self, path):
+        path = self._path(path)
+        with open(path, 'a'):
+            os.utime(path, None)
+
+    def open(self, path, mode='r', encoding='utf-8'):
+        return open(self._path(path), mode, encoding=None if 'b' in mode else encoding)
+
+    def remove(self, path):
+        os.remove(self._path(path))
+
+    def rmdir(self, path):
+        os.rmdir(self._path(path))
+
+    def copy(self, src, dst):
+        shutil.copy(self._path(src), self._path(dst))
+
+    def move(self, src, dst):
+        shutil.move(self._path(src), self._path(dst))
+
+def get_fs(user, session=None):
+    """Returns the filesystem backend the file commands use for this user."""
+    session = session or current_session()
+    filesystems = session.filesystems if session else _FILESYSTEMS
+    fs = filesystems.get(user['name'])
+    if fs is None:
+        if user.get('fs') == 'vfs':
+            fs = pyhx_vfs.SqliteFS(os.path.join(HOMES_DIR, f"{user['name']}.pyhxfs"))
+        else:
+            fs = HostFS(session)
+        filesystems[user['name']] = fs
+    return fs
+
 # --- User and Auth Helper Functions ---
 def hash_password(password):
     """Hashes a password using SHA-256."""
@@ -36,21 +193,26 @@ def hash_password(password):
 
 def load_users():
     """Loads user data from the JSON file or creates a default root user."""
-    try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # If file doesn't exist or is corrupt, create a default root user
-        print("First run detected or users.json is invalid. Creating default 'root' user.")
-        print("Default password is 'root'. Please change it immediately with 'changepass'.")
-        default_users = {"root": {"password": hash_password("root"), "role": "admin"}}
-        save_users(default_users)
-        return default_users
+    with _USERS_LOCK:
+        try:
+            with open(USERS_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # If file doesn't exist or is corrupt, create a default root user
+            print("First run detected or users.json is invalid. Creating default 'root' user.")
+            print("Default password is 'root'. Please change it immediately with 'changepass'.")
+            default_users = {"root": {"password": hash_password("root"), "role": "admin"}}
+            save_users(default_users)
+            return default_users
 
 def save_users(users_data):
     """Saves user data to the JSON file."""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users_data, f, indent=4)
+    # Write-then-rename so concurrent sessions never read a half-written file
+    with _USERS_LOCK:
+        tmp_file = USERS_FILE + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(users_data, f, indent=4)
+        os.replace(tmp_file, USERS_FILE)
 
 def get_hostname():
     """Reads the hostname from its file or returns a default."""
@@ -64,6 +226,31 @@ def get_hostname():
             f.write(default_hostname)
         return default_hostname
 
+def module_command(module, args):
+    """
+    Returns (command, env) for running one of PyHx's own modules, such as
+    'tools.pyhx_converter', in a child interpreter. The module is imported
+    from CODE_ROOT, so this works from loose sources and from the bundle.
+    """
+    path = os.pathsep.join(filter(None, [CODE_ROOT, os.environ.get('PYTHONPATH')]))
+    return [sys.executable, '-m', module] + args, dict(os.environ, PYTHONPATH=path)
+
+# --- Audit Log ---
+# Started by cli() once the data directory is known; events logged earlier wait in its queue
+AUDIT = pyhx_audit.AuditLog(AUDIT_FILE)
+
+def audit(event, user=None, **fields):
+    """Records an event in the audit log, tagged with the user and where the session comes from."""
+    session = current_session()
+    origin = session.peer if session else 'local'
+    AUDIT.log(event, user=user['name'] if user else None, origin=origin, **fields)
+
+def _audit_args(command, args):
+    """The arguments of a command as written to the audit log, with passwords masked."""
+    if command == 'user' and args[:1] == ['add'] and len(args) > 3:
+        return args[:3] + ['***']  # Everything after the username
+    return args
+
 # --- BACKEND COMMAND LOGIC ---
 def _sysinfo_logic(args, user):
     uptime_seconds = int(time.time() - START_TIME)
@@ -72,7 +259,7 @@ def _sysinfo_logic(args, user):
     print(f"Hostname:     {get_hostname()}")
     print(f"Uptime:       {uptime_str}")
     print(f"User:         {user['name']} (Role: {user['role']})")
-    print(f"Location:     {os.getcwd()}")
+    print(f"Location:     {get_fs(user).getcwd()}")
     return True, user
 
 def _help_logic(args, user):
@@ -95,11 +282,14 @@ def _help_logic(args, user):
     return True, user
 
 def _clear_logic(args, user):
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if current_session():
+        print("\033[2J\033[H", end='')
+    else:
+        os.system('cls' if os.name == 'nt' else 'clear')
     return True, user
 
 def _history_logic(args, user):
-    for i, cmd in enumerate(COMMAND_HISTORY):
+    for i, cmd in enumerate(current_history()):
         print(f"{i+1:3d}  {cmd}")
     return True, user
 
@@ -108,7 +298,11 @@ def _datetime_logic(args, user):
     return True, user
 
 def _restart_logic(args, user):
+    if current_session():
+        print("Error: 'restart' is not available in server sessions.")
+        return True, user
     print("Restarting PyHx shell...")
+    AUDIT.close()  # execv skips atexit handlers
     os.execv(sys.executable, ['python'] + sys.argv)
     return False, user
 
@@ -121,7 +315,7 @@ def _version_logic(args, user):
     return True, user
 
 def _pwd_logic(args, user):
-    print(os.getcwd())
+    print(get_fs(user).getcwd())
     return True, user
 
 def _cd_logic(args, user):
@@ -129,7 +323,7 @@ def _cd_logic(args, user):
         print("Usage: go <directory>")
         return True, user
     try:
-        os.chdir(args[0])
+        get_fs(user).chdir(args[0])
     except FileNotFoundError:
         print(f"Error: Directory '{args[0]}' not found.")
     except Exception as e:
@@ -139,11 +333,10 @@ def _cd_logic(args, user):
 def _ls_logic(args, user):
     path = args[0] if args else "."
     try:
-        files = os.listdir(path)
-        if not files:
+        entries = get_fs(user).entries(path)
+        if not entries:
             print(f"Directory '{path}' is empty.")
-        for f in sorted(files, key=str.lower):
-            is_dir = os.path.isdir(os.path.join(path, f))
+        for f, is_dir in sorted(entries, key=lambda entry: entry[0].lower()):
             print(f"{'[DIR] ' if is_dir else '      '}{f}")
     except FileNotFoundError:
         print(f"Error: Directory '{path}' not found.")
@@ -156,14 +349,13 @@ def _make_logic(args, user):
     make_type, name = args[0], " ".join(args[1:])
     if make_type == 'file':
         try:
-            with open(name, 'a'):
-                os.utime(name, None)
+            get_fs(user).touch(name)
             print(f"File '{name}' created.")
         except Exception as e:
             print(f"Error creating file: {e}")
     elif make_type == 'dir':
         try:
-            os.makedirs(name)
+            get_fs(user).makedirs(name)
             print(f"Directory '{name}' created.")
         except FileExistsError:
             print(f"Error: Directory '{name}' already exists.")
@@ -178,7 +370,7 @@ def _read_logic(args, user):
         print("Usage: read <filename>")
         return True, user
     try:
-        with open(args[0], 'r', encoding='utf-8') as f:
+        with get_fs(user).open(args[0], 'r', encoding='utf-8') as f:
             print(f.read())
     except FileNotFoundError:
         print(f"Error: File '{args[0]}' not found.")
@@ -192,15 +384,16 @@ def _delete_logic(args, user):
         return True, user
     target = args[0]
     try:
-        confirmation = input(f"Are you sure you want to delete '{target}'? (y/n): ")
+        confirmation = prompt_input(f"Are you sure you want to delete '{target}'? (y/n): ")
         if confirmation.lower() != 'y':
             print("Deletion cancelled.")
             return True, user
-        if os.path.isdir(target):
-            os.rmdir(target)
+        fs = get_fs(user)
+        if fs.isdir(target):
+            fs.rmdir(target)
             print(f"Directory '{target}' deleted.")
         else:
-            os.remove(target)
+            fs.remove(target)
             print(f"File '{target}' deleted.")
     except FileNotFoundError:
         print(f"Error: '{target}' not found.")
@@ -215,7 +408,7 @@ def _copy_logic(args, user):
         print("Usage: copy <source> <destination>")
         return True, user
     try:
-        shutil.copy(args[0], args[1])
+        get_fs(user).copy(args[0], args[1])
         print(f"Copied '{args[0]}' to '{args[1]}'.")
     except Exception as e:
         print(f"Error copying file: {e}")
@@ -226,7 +419,7 @@ def _move_logic(args, user):
         print("Usage: move <source> <destination>")
         return True, user
     try:
-        shutil.move(args[0], args[1])
+        get_fs(user).move(args[0], args[1])
         print(f"Moved '{args[0]}' to '{args[1]}'.")
     except Exception as e:
         print(f"Error moving file: {e}")
@@ -236,7 +429,7 @@ def _say_logic(args, user, outfile=None, append=False):
     output = " ".join(args)
     if outfile:
         try:
-            with open(outfile, 'a' if append else 'w', encoding='utf-8') as f:
+            with get_fs(user).open(outfile, 'a' if append else 'w', encoding='utf-8') as f:
                 f.write(output + '\n')
         except Exception as e:
             print(f"Error writing to file: {e}")
@@ -250,7 +443,7 @@ def _count_logic(args, user):
         return True, user
     try:
         lines, words, chars = 0, 0, 0
-        with open(args[0], 'r', encoding='utf-8') as f:
+        with get_fs(user).open(args[0], 'r', encoding='utf-8') as f:
             for line in f:
                 lines += 1
                 words += len(line.split())
@@ -266,7 +459,7 @@ def _findtext_logic(args, user):
         return True, user
     pattern, filename = args[0], args[1]
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
+        with get_fs(user).open(filename, 'r', encoding='utf-8') as f:
             for i, line in enumerate(f):
                 if re.search(pattern, line, re.IGNORECASE):
                     print(f"{i+1}:{line.strip()}")
@@ -274,19 +467,101 @@ def _findtext_logic(args, user):
         print(f"Error: File '{filename}' not found.")
     return True, user
 
+def _index_logic(args, user):
+    from tools import pyhx_index
+    if len(args) < 2 or args[0] not in ['build', 'search']:
+        print("Usage: index build <directory>")
+        print("       index search <words...> [/regex/]")
+        return True, user
+    if not isinstance(get_fs(user), HostFS):
+        print("Error: The text index is not available in virtual home directories.")
+        return True, user
+    sub_command, sub_args = args[0], args[1:]
+    index = pyhx_index.TextIndex(INDEX_FILE)
+    start = time.perf_counter()
+    try:
+        if sub_command == 'build':
+            root = resolve_path(sub_args[0])
+            if not os.path.isdir(root):
+                print(f"Error: Directory '{sub_args[0]}' not found.")
+                return True, user
+            added, updated, removed, unchanged = index.build(root)
+            print(f"Indexed '{sub_args[0]}': {added} added, {updated} updated, {removed} removed, "
+                  f"{unchanged} unchanged ({time.perf_counter() - start:.2f}s).")
+        else:
+            # Words wrapped in slashes are regexes, checked only on lines the words already matched
+            words, patterns = [], []
+            for arg in sub_args:
+                if len(arg) > 2 and arg.startswith('/') and arg.endswith('/'):
+                    patterns.append(arg[1:-1])
+                else:
+                    words.append(arg)
+            if words and not pyhx_index.tokenize(" ".join(words)):
+                print("Error: Search words must contain letters or digits. Use /regex/ to match other characters.")
+                return True, user
+            hits = 0
+            for path, number, text in index.search(words, patterns):
+                hits += 1
+                print(f"{os.path.relpath(path, get_fs(user).getcwd())}:{number}:{text.strip()}")
+            print(f"{hits} hit(s) in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    except re.error as e:
+        print(f"Error: Invalid regex. {e}")
+    except Exception as e:
+        print(f"Error: Index operation failed. {e}")
+    finally:
+        index.close()
+    return True, user
+
+def _usage_logic(args, user):
+    from tools import pyhx_usage
+    depth = 1
+    rescan = '--rescan' in args
+    args = [a for a in args if a != '--rescan']
+    if '--depth' in args:
+        i = args.index('--depth')
+        try:
+            depth = int(args[i + 1])
+        except (IndexError, ValueError):
+            print("Usage: usage [directory] [--depth N] [--rescan]")
+            return True, user
+        args = args[:i] + args[i + 2:]
+    if not isinstance(get_fs(user), HostFS):
+        print("Error: Disk usage is not available in virtual home directories.")
+        return True, user
+    target = args[0] if args else "."
+    root = os.path.abspath(resolve_path(target))
+    if not os.path.isdir(root):
+        print(f"Error: Directory '{target}' not found.")
+        return True, user
+    start = time.perf_counter()
+    try:
+        totals = pyhx_usage.disk_usage(root, USAGE_CACHE_FILE, rescan=rescan)
+    except Exception as e:
+        print(f"Error: Could not measure '{target}'. {e}")
+        return True, user
+    base = root.count(os.sep) - (1 if root.endswith(os.sep) else 0)
+    rows = [(size, files, path) for path, (size, files) in totals.items()
+            if path != root and path.count(os.sep) - base <= depth]
+    for size, files, path in sorted(rows, reverse=True):
+        print(f"{pyhx_usage.format_size(size):>10}  {files:>8} files  {os.path.relpath(path, root)}")
+    size, files = totals.get(root, (0, 0))
+    print(f"{pyhx_usage.format_size(size):>10}  {files:>8} files  total ({time.perf_counter() - start:.2f}s)")
+    return True, user
+
 def _changepass_logic(args, user):
     print(f"Changing password for {user['name']}.")
     users = load_users()
-    current_pass = getpass.getpass("Current password: ")
+    current_pass = prompt_password("Current password: ")
     if hash_password(current_pass) != users[user['name']]['password']:
         print("Authentication failed.")
         return True, user
-    new_pass = getpass.getpass("New password: ")
-    if new_pass != getpass.getpass("Confirm new password: "):
+    new_pass = prompt_password("New password: ")
+    if new_pass != prompt_password("Confirm new password: "):
         print("Passwords do not match.")
         return True, user
     users[user['name']]['password'] = hash_password(new_pass)
     save_users(users)
+    audit('password', user)
     print("Password changed successfully.")
     return True, user
 
@@ -299,16 +574,97 @@ def _switchuser_logic(args, user):
         print("Switch user failed. Returning to current session.")
         return True, user
 
+def _calc_options(args):
+    """Splits calc arguments into (options, remaining tokens)."""
+    options = {'mode': 'float', 'prec': None, 'each': False, 'col': None, 'stats': False}
+    rest = []
+    tokens = iter(args)
+    for token in tokens:
+        if token == '--decimal':
+            options['mode'] = 'decimal'
+        elif token == '--exact':
+            options['mode'] = 'fraction'
+        elif token == '--each':
+            options['each'] = True
+        elif token == '--stats':
+            options['stats'] = True
+        elif token in ('--col', '--prec'):
+            options[token[2:]] = int(next(tokens, ''))
+        else:
+            rest.append(token)
+    return options, rest
+
+def _calc_each(expression, filename, options, calc_vars, user):
+    """Applies an expression to every line (or one column) of a file, streaming the results."""
+    from tools import pyhx_calc
+    count, skipped, total, low, high = 0, 0, 0, None, None
+    with get_fs(user).open(filename, 'r', encoding='utf-8') as f:
+        output = []
+        for number, result in pyhx_calc.evaluate_lines(expression, f, calc_vars, options['col'], options['mode']):
+            if result is None:
+                skipped += 1
+            elif isinstance(result, Exception):
+                output.append(f"{number}: Error: {result}")
+            else:
+                count += 1
+                total += result
+                low = result if low is None or result < low else low
+                high = result if high is None or result > high else high
+                if not options['stats']:
+                    output.append(str(result))
+            if len(output) >= pyhx_calc.BLOCK_LINES:
+                print("\n".join(output))
+                output = []
+        if output:
+            print("\n".join(output))
+    if options['stats'] and count:
+        print(f"Count: {count}, Sum: {total}, Min: {low}, Max: {high}, Mean: {total / count}")
+    elif options['stats']:
+        print("No numeric lines found.")
+    if skipped:
+        print(f"Skipped {skipped} non-numeric line(s).")
+
 def _calc_logic(args, user):
-    if not args:
-        print("Usage: calc <expression>")
+    import decimal
+    from tools import pyhx_calc
+    try:
+        options, rest = _calc_options(args)
+    except ValueError:
+        print("Error: --col and --prec need a number.")
+        return True, user
+    if not rest or (options['each'] and len(rest) < 2):
+        print("Usage: calc [--decimal [--prec N] | --exact] <expression>")
+        print("       calc <name> = <expression>")
+        print("       calc --each <expression> <file> [--col N] [--stats]")
         return True, user
-    expression = "".join(args)
-    if not re.match(r"^[0-9+\-*/.() ]+$", expression):
-        print("Error: Invalid characters in expression.")
+    if options['prec'] is not None and not 0 < options['prec'] <= pyhx_calc.MAX_PRECISION:
+        print(f"Error: --prec must be between 1 and {pyhx_calc.MAX_PRECISION}.")
         return True, user
+    session = current_session()
+    calc_vars = session.calc_vars if session else _CALC_VARS
     try:
-        print(eval(expression))
+        with decimal.localcontext() as context:
+            if options['prec']:
+                context.prec = options['prec']
+            if options['each']:
+                expression = "".join(rest[:-1]).strip('\'"')
+                _calc_each(expression, rest[-1], options, calc_vars, user)
+                return True, user
+            expression = "".join(rest).strip('\'"')
+            name, value = '', expression
+            if re.match(r"^[A-Za-z]\w*=[^=]", expression):
+                name, value = expression.split('=', 1)
+            result = pyhx_calc.compile_expression(value, options['mode'])(calc_vars)
+            calc_vars['ans'] = result
+            if name:
+                calc_vars[name] = result
+                print(f"{name} = {result}")
+            else:
+                print(result)
+    except FileNotFoundError:
+        print(f"Error: File '{rest[-1]}' not found.")
+    except SyntaxError:
+        print("Error: Invalid expression.")
     except Exception as e:
         print(f"Error: {e}")
     return True, user
@@ -348,8 +704,8 @@ def _user_logic(args, user):
     if user['role'] != 'admin':
         print("Error: Permission denied.")
         return True, user
-    if not args or args[0] not in ['add', 'delete']:
-        print("Usage: user <add|delete> ...")
+    if not args or args[0] not in ['add', 'delete', 'fs']:
+        print("Usage: user <add|delete|fs> ...")
         return True, user
     sub_command, sub_args = args[0], args[1:]
     if sub_command == "add":
@@ -364,6 +720,7 @@ def _user_logic(args, user):
             return True, user
         users[username] = {"password": hash_password(password), "role": role}
         save_users(users)
+        audit('user', user, action='add', target=username, role=role)
         print(f"Successfully added user '{username}' with role '{role}'.")
     elif sub_command == "delete":
         if len(sub_args) != 1:
@@ -380,13 +737,27 @@ def _user_logic(args, user):
         if username_to_delete == user['name']:
             print("Error: You cannot delete yourself.")
             return True, user
-        confirmation = input(f"To confirm deletion of '{username_to_delete}', please type the username again: ")
+        confirmation = prompt_input(f"To confirm deletion of '{username_to_delete}', please type the username again: ")
         if confirmation != username_to_delete:
             print("Confirmation failed.")
             return True, user
         del users[username_to_delete]
         save_users(users)
+        audit('user', user, action='delete', target=username_to_delete)
         print(f"Successfully deleted user '{username_to_delete}'.")
+    elif sub_command == "fs":
+        if len(sub_args) != 2 or sub_args[1] not in ['host', 'vfs']:
+            print("Usage: user fs <username> <host|vfs>")
+            return True, user
+        username, backend = sub_args
+        users = load_users()
+        if username not in users:
+            print(f"Error: User '{username}' not found.")
+            return True, user
+        users[username]['fs'] = backend
+        save_users(users)
+        audit('user', user, action='fs', target=username, fs=backend)
+        print(f"User '{username}' will use the '{backend}' filesystem from their next login.")
     return True, user
 
 def _net_logic(args, user):
@@ -401,7 +772,7 @@ def _net_logic(args, user):
         param = '-n' if platform.system().lower() == 'windows' else '-c'
         command = ['ping', param, '4', sub_args[0]]
         try:
-            subprocess.run(command)
+            run_process(command)
         except FileNotFoundError:
             print("Error: 'ping' command not found.")
     elif sub_command == 'lookup':
@@ -409,7 +780,7 @@ def _net_logic(args, user):
             print("Usage: net lookup <host>")
             return True, user
         try:
-            subprocess.run(['nslookup', sub_args[0]])
+            run_process(['nslookup', sub_args[0]])
         except FileNotFoundError:
             print("Error: 'nslookup' command not found.")
     elif sub_command == 'get':
@@ -426,22 +797,259 @@ def _net_logic(args, user):
             print(f"Error fetching URL: {e}")
     return True, user
 
+# --- App Environments ---
+# Apps that declare requirements run in a virtual environment shared by every
+# app with the same requirement set. The environment is built on first use and
+# afterwards only looked up, so warm launches pay no install cost.
+_ENV_LOCKS = collections.defaultdict(threading.Lock)
+_ENVS_IN_USE = collections.Counter()
+_ENV_STATE_LOCK = threading.Lock()
+
+def read_manifest(pkg_path):
+    """Reads an app's manifest (pyhx.json, or a bare requirements.txt) from its archive."""
+    with zipfile.ZipFile(pkg_path) as archive:
+        names = set(archive.namelist())
+        if MANIFEST_NAME in names:
+            manifest = json.loads(archive.read(MANIFEST_NAME).decode('utf-8'))
+            requirements = manifest.get('requirements', []) if isinstance(manifest, dict) else None
+            if not isinstance(requirements, list) or not all(isinstance(r, str) for r in requirements):
+                raise ValueError("'requirements' must be a list of strings")
+            return manifest
+        if 'requirements.txt' in names:
+            return {"requirements": archive.read('requirements.txt').decode('utf-8').splitlines()}
+    return {}
+
+def requirements_key(requirements):
+    """Normalises a requirement list and returns (requirements, hash key)."""
+    normalized = sorted({r.strip() for r in requirements if r.strip() and not r.strip().startswith('#')})
+    return normalized, hashlib.sha256("\n".join(normalized).encode('utf-8')).hexdigest()[:16]
+
+def env_python(env_dir):
+    """Returns the interpreter path inside a virtual environment."""
+    if os.name == 'nt':
+        return os.path.join(env_dir, 'Scripts', 'python.exe')
+    return os.path.join(env_dir, 'bin', 'python')
+
+def _build_env(env_dir, requirements):
+    print(f"Preparing environment for {', '.join(requirements)} (first run only)...")
+    shutil.rmtree(env_dir, ignore_errors=True)
+    try:
+        run_process([sys.executable, '-m', 'venv', env_dir], check=True)
+        pip = [env_python(env_dir), '-m', 'pip', 'install', '--disable-pip-version-check', '-q']
+        if os.path.isdir(WHEELS_DIR) and os.listdir(WHEELS_DIR):
+            # Offline install from the local wheel directory
+            pip += ['--no-index', '--find-links', os.path.abspath(WHEELS_DIR)]
+        run_process(pip + requirements, check=True)
+    except BaseException:
+        shutil.rmtree(env_dir, ignore_errors=True)
+        raise
+    with open(os.path.join(env_dir, ENV_READY_FILE), 'w', encoding='utf-8') as f:
+        f.write("\n".join(requirements))
+
+def _evict_envs(keep):
+    """Removes the least recently used environments beyond ENV_CACHE_LIMIT."""
+    ready = []
+    for name in os.listdir(ENVS_DIR):
+        marker = os.path.join(ENVS_DIR, name, ENV_READY_FILE)
+        if name != keep and os.path.exists(marker):
+            ready.append((os.path.getmtime(marker), name))
+    for _, name in sorted(ready, reverse=True)[ENV_CACHE_LIMIT - 1:]:
+        with _ENV_STATE_LOCK:
+            lock = _ENV_LOCKS[name]
+        # Holding the env's own lock keeps acquire_env() from launching it mid-delete
+        if not lock.acquire(blocking=False):
+            continue  # Being built or launched right now
+        try:
+            with _ENV_STATE_LOCK:
+                in_use = _ENVS_IN_USE[name]
+            if not in_use:
+                env_dir = os.path.join(ENVS_DIR, name)
+                os.remove(os.path.join(env_dir, ENV_READY_FILE))  # Never leave a half-deleted env marked ready
+                shutil.rmtree(env_dir, ignore_errors=True)
+        except OSError:
+            pass
+        finally:
+            lock.release()
+
+def acquire_env(requirements):
+    """
+    Returns (python, env_key) for a requirement set, building its environment
+    on first use. Callers must pass env_key to release_env() when done.
+    """
+    requirements, key = requirements_key(requirements)
+    if not requirements:
+        return sys.executable, None
+    env_dir = os.path.abspath(os.path.join(ENVS_DIR, key))
+    marker = os.path.join(env_dir, ENV_READY_FILE)
+    with _ENV_STATE_LOCK:
+        lock = _ENV_LOCKS[key]
+    with lock:
+        built = not os.path.exists(marker)
+        if built:
+            os.makedirs(ENVS_DIR, exist_ok=True)
+            _build_env(env_dir, requirements)
+        os.utime(marker, None)  # Last-used time drives LRU eviction
+        with _ENV_STATE_LOCK:
+            _ENVS_IN_USE[key] += 1
+    if built:
+        _evict_envs(keep=key)
+    return env_python(env_dir), key
+
+def release_env(key):
+    """Marks an environment returned by acquire_env() as no longer running."""
+    if key:
+        with _ENV_STATE_LOCK:
+            _ENVS_IN_USE[key] -= 1
+
+# --- Package Integrity ---
+# Packages record a sha256 per entry (see pyhx_converter.HASHES_NAME). Installs
+# verify every entry in parallel; launches verify while unpacking and remember
+# the result by archive mtime and size, so warm launches skip hashing entirely.
+_VERIFIED = None
+_VERIFY_LOCK = threading.Lock()
+CORRUPT_ARCHIVE_ERRORS = (zipfile.BadZipFile, EOFError, zlib.error)
+
+def _hash_entries(pkg_path, names):
+    """Hashes a group of entries through its own handle on the archive."""
+    hashes = {}
+    with zipfile.ZipFile(pkg_path) as archive:
+        for name in names:
+            digest = hashlib.sha256()
+            with archive.open(name) as member:
+                for block in iter(lambda: member.read(1024 * 1024), b''):
+                    digest.update(block)
+            hashes[name] = digest.hexdigest()
+    return hashes
+
+def verify_package(pkg_path):
+    """
+    Checks every entry of a package against its recorded hashes, spreading the
+    work over VERIFY_WORKERS threads. Returns (problems, has_hashes); packages
+    built without hashes are only checked against their zip CRCs.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from tools import pyhx_converter
+    with zipfile.ZipFile(pkg_path) as archive:
+        expected = pyhx_converter.read_entry_hashes(archive)
+        if expected is None:
+            bad_entry = archive.testzip()
+            return ([f"'{bad_entry}' is corrupt"] if bad_entry else []), False
+        sizes = {info.filename: info.file_size for info in archive.infolist()}
+    present = set(sizes) - {pyhx_converter.HASHES_NAME}
+    problems = [f"'{name}' is missing" for name in sorted(set(expected) - present)]
+    problems += [f"'{name}' is not listed in the package hashes" for name in sorted(present - set(expected))]
+    # Deal entries out largest-first so every worker gets a similar amount of data
+    names = sorted(set(expected) & present, key=sizes.get, reverse=True)
+    groups = [group for group in (names[i::VERIFY_WORKERS] for i in range(VERIFY_WORKERS)) if group]
+    with ThreadPoolExecutor(max_workers=VERIFY_WORKERS) as pool:
+        for hashes in pool.map(functools.partial(_hash_entries, pkg_path), groups):
+            problems += [f"'{name}' does not match its recorded hash"
+                         for name, digest in sorted(hashes.items()) if digest != expected[name]]
+    return problems, True
+
+def extract_package(pkg_path, dest_dir, expected=None):
+    """
+    Unpacks a package into dest_dir. When `expected` hashes are given, each
+    entry is hashed as it is written; returns the names that did not match.
+    """
+    from tools import pyhx_converter
+    mismatched = []
+    with zipfile.ZipFile(pkg_path) as archive:
+        for info in archive.infolist():
+            parts = info.filename.split('/')
+            if info.filename.startswith('/') or '..' in parts:
+                continue  # Same rule as shutil.unpack_archive
+            target = os.path.join(dest_dir, *parts)
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            digest = hashlib.sha256() if expected is not None else None
+            with archive.open(info) as member, open(target, 'wb') as out:
+                for block in iter(lambda: member.read(1024 * 1024), b''):
+                    if digest:
+                        digest.update(block)
+                    out.write(block)
+            if digest and info.filename != pyhx_converter.HASHES_NAME and expected.get(info.filename) != digest.hexdigest():
+                mismatched.append(info.filename)
+        if expected is not None:
+            mismatched += sorted(set(expected) - set(archive.namelist()))
+    return mismatched
+
+def _verified_cache():
+    global _VERIFIED
+    if _VERIFIED is None:
+        try:
+            with open(VERIFIED_FILE, 'r', encoding='utf-8') as f:
+                _VERIFIED = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _VERIFIED = {}
+    return _VERIFIED
+
+def _package_stamp(pkg_path):
+    stat = os.stat(pkg_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def is_verified(pkg_path):
+    """Tells whether this exact archive (by mtime and size) already passed verification."""
+    with _VERIFY_LOCK:
+        return _verified_cache().get(os.path.basename(pkg_path)) == _package_stamp(pkg_path)
+
+def mark_verified(pkg_path, ok=True):
+    """Records (or forgets) that an installed archive passed verification."""
+    with _VERIFY_LOCK:
+        cache = _verified_cache()
+        if ok:
+            cache[os.path.basename(pkg_path)] = _package_stamp(pkg_path)
+        else:
+            cache.pop(os.path.basename(pkg_path), None)
+        tmp_file = VERIFIED_FILE + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=4)
+        os.replace(tmp_file, VERIFIED_FILE)
+
 # --- RESTORED APP COMMANDS ---
 def convert_command(args, user):
-    if len(args) != 2 or args[0] != '-pyhx':
+    if '--watch' in args:
+        return _watch_convert([a for a in args if a != '--watch'], user)
+    if len(args) == 3 and args[0] == '-delta':
+        converter_args = ['--delta', os.path.join(INSTALLED_DIR, args[1]), resolve_path(args[2])]
+    elif len(args) == 2 and args[0] == '-pyhx':
+        converter_args = [resolve_path(args[1])]
+    else:
         print("Usage: convert -pyhx <folder_name>")
+        print("       convert -delta <installed.pyhx> <folder_name>")
         return True, user
-    folder = args[1]
-    script = os.path.join('tools', 'pyhx_converter.py')
+    folder = converter_args[-1]
+    command, env = module_command('tools.pyhx_converter', converter_args)
     print(f"Invoking converter for '{folder}'...")
     try:
-        subprocess.run([sys.executable, script, folder], check=True)
-    except FileNotFoundError:
-        print("Error: Converter script not found. Make sure 'tools/pyhx_converter.py' exists.")
+        run_process(command, check=True, env=env)
     except Exception:
         print("Error during conversion process.")
     return True, user
 
+def _watch_convert(args, user):
+    from tools import pyhx_converter
+    install = '--install' in args
+    args = [a for a in args if a != '--install']
+    if len(args) != 2 or args[0] != '-pyhx':
+        print("Usage: convert -pyhx --watch <folder_name> [--install]")
+        return True, user
+    if current_session():
+        print("Error: Watch mode is only available in the local shell.")
+        return True, user
+    # Builds from the user's own sources are trusted, so auto-installed
+    # packages are marked verified and launch without a hashing pass.
+    output_dir = INSTALLED_DIR if install else PACKAGES_DIR
+    try:
+        pyhx_converter.watch_package(resolve_path(args[1]), output_dir, on_build=mark_verified if install else None)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    except Exception as e:
+        print(f"Error during watch: {e}")
+    return True, user
+
 def install_command(args, user):
     if not args:
         print("Usage: install <package.pyhx>")
@@ -452,14 +1060,65 @@ def install_command(args, user):
     if not os.path.exists(src):
         print(f"Error: Package '{pkg_name}' not found in staging area ('{PACKAGES_DIR}').")
         return True, user
+    try:
+        problems, _ = verify_package(src)
+    except CORRUPT_ARCHIVE_ERRORS as e:
+        problems = [f"The archive is unreadable. {e}"]
+    except ValueError as e:
+        problems = [f"The recorded hashes are unreadable. {e}"]
+    if problems:
+        audit('install', user, package=pkg_name, ok=False, problems=len(problems))
+        print(f"Error: Package '{pkg_name}' failed verification and was not installed.")
+        for problem in problems[:10]:
+            print(f"  {problem}")
+        return True, user
     try:
         shutil.move(src, dst)
+        mark_verified(dst)
+        audit('install', user, package=pkg_name, ok=True)
         print(f"Successfully installed '{pkg_name}'.")
     except Exception as e:
+        audit('install', user, package=pkg_name, ok=False, error=str(e))
         print(f"Error during installation: {e}")
     return True, user
 
+def update_command(args, user):
+    from tools import pyhx_converter
+    if not args:
+        print("Usage: update <package.pyhxd>")
+        return True, user
+    delta_name = args[0]
+    delta_path = os.path.join(PACKAGES_DIR, delta_name)
+    if not os.path.exists(delta_path):
+        print(f"Error: Update '{delta_name}' not found in staging area ('{PACKAGES_DIR}').")
+        return True, user
+    try:
+        pkg_name = pyhx_converter.read_delta_manifest(delta_path)['package']
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        print(f"Error: '{delta_name}' is not a valid update package. {e}")
+        return True, user
+    pkg_path = os.path.join(INSTALLED_DIR, os.path.basename(pkg_name))
+    if not os.path.exists(pkg_path):
+        print(f"Error: Package '{pkg_name}' is not installed.")
+        return True, user
+    # Build the new version next to the old one, then swap it in atomically
+    temp_path = pkg_path + ".updating"
+    try:
+        pyhx_converter.apply_delta_package(pkg_path, delta_path, temp_path)
+        os.replace(temp_path, pkg_path)
+        os.remove(delta_path)
+        print(f"Successfully updated '{pkg_name}'.")
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        print(f"Error: Could not apply update. {e}")
+    except Exception as e:
+        print(f"Error during update: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True, user
+
 def run_command(args, user):
+    from tools import pyhx_converter
     if not args:
         print("Usage: run <package.pyhx>")
         return True, user
@@ -468,29 +1127,93 @@ def run_command(args, user):
     if not os.path.exists(pkg_path):
         print(f"Error: Package '{pkg_name}' is not installed.")
         return True, user
+    try:
+        python, env_key = acquire_env(read_manifest(pkg_path).get('requirements', []))
+    except subprocess.CalledProcessError:
+        print(f"Error: Could not install the requirements of '{pkg_name}'.")
+        return True, user
+    except CORRUPT_ARCHIVE_ERRORS as e:
+        print(f"Error: Package '{pkg_name}' is corrupt. {e}")
+        return True, user
+    except (ValueError, AttributeError) as e:
+        print(f"Error: Package '{pkg_name}' has an invalid manifest. {e}")
+        return True, user
     temp_dir = tempfile.mkdtemp(prefix="pyhx_run_")
     try:
-        shutil.unpack_archive(pkg_path, temp_dir, 'zip')
+        verified = is_verified(pkg_path)
+        expected = None
+        if not verified:
+            try:
+                with zipfile.ZipFile(pkg_path) as archive:
+                    expected = pyhx_converter.read_entry_hashes(archive)
+            except ValueError as e:
+                mark_verified(pkg_path, ok=False)
+                audit('run', user, package=pkg_name, exit_code=None, error="failed verification")
+                print(f"Error: Package '{pkg_name}' failed verification ({e}). Please reinstall it.")
+                return True, user
+        mismatched = extract_package(pkg_path, temp_dir, expected)
+        if mismatched:
+            mark_verified(pkg_path, ok=False)
+            audit('run', user, package=pkg_name, exit_code=None, error="failed verification")
+            print(f"Error: Package '{pkg_name}' failed verification ({len(mismatched)} damaged entries). Please reinstall it.")
+            return True, user
+        if not verified:
+            mark_verified(pkg_path)
         entry_point = os.path.join(temp_dir, 'main.py')
         if not os.path.exists(entry_point):
             print(f"Error: 'main.py' not found in package '{pkg_name}'.")
             return True, user
         print(f"\n--- Running {pkg_name} ---")
-        subprocess.run([sys.executable, 'main.py'], cwd=temp_dir)
+        start = time.perf_counter()
+        result = run_process([python, 'main.py'], cwd=temp_dir)
+        audit('run', user, package=pkg_name, exit_code=result.returncode,
+              duration=round(time.perf_counter() - start, 3))
         print(f"--- {pkg_name} finished ---\n")
+    except CORRUPT_ARCHIVE_ERRORS as e:
+        mark_verified(pkg_path, ok=False)
+        print(f"Error: Package '{pkg_name}' is corrupt. {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
+        release_env(env_key)
         shutil.rmtree(temp_dir)
     return True, user
 
+def verify_command(args, user):
+    names = args or sorted(name for name in os.listdir(INSTALLED_DIR) if name.endswith('.pyhx'))
+    if not names:
+        print("No packages are installed.")
+        return True, user
+    failed = 0
+    for pkg_name in names:
+        pkg_path = os.path.join(INSTALLED_DIR, pkg_name)
+        if not os.path.exists(pkg_path):
+            print(f"  {pkg_name:<24} not installed")
+            failed += 1
+            continue
+        try:
+            problems, has_hashes = verify_package(pkg_path)
+        except CORRUPT_ARCHIVE_ERRORS as e:
+            problems, has_hashes = [f"The archive is unreadable. {e}"], True
+        except ValueError as e:
+            problems, has_hashes = [f"The recorded hashes are unreadable. {e}"], True
+        mark_verified(pkg_path, ok=not problems)
+        status = "OK" if has_hashes else "OK (no recorded hashes, CRC checked)"
+        print(f"  {pkg_name:<24} {status if not problems else 'FAILED'}")
+        for problem in problems:
+            print(f"      {problem}")
+        failed += bool(problems)
+    print(f"Verified {len(names)} package(s), {failed} failed.")
+    return True, user
+
 def store_gui_command(args, user):
-    script = os.path.join('store', 'store_gui.py')
+    if current_session():
+        print("Error: The App Store is only available in the local shell.")
+        return True, user
+    command, env = module_command('store.store_gui', [])
     print("Launching App Store...")
     try:
-        subprocess.run([sys.executable, script])
-    except FileNotFoundError:
-        print("Error: App Store script not found. Make sure 'store/store_gui.py' exists.")
+        subprocess.run(command, env=env)
     except Exception as e:
         print(f"Error launching the store: {e}")
     return True, user
@@ -521,20 +1244,24 @@ COMMANDS = {
     "say": {"func": _say_logic, "help": 'Prints text. Use > to make a file (e.g., say "hi" > a.txt).', "category": "File"},
     "count": {"func": _count_logic, "help": "Count lines, words, and characters in a file.", "category": "File"},
     "findtext": {"func": _findtext_logic, "help": "Find text inside a file.", "category": "File"},
+    "index": {"func": _index_logic, "help": "Indexes a folder's text (index build <dir>) for fast 'index search <words>'.", "category": "File"},
+    "usage": {"func": _usage_logic, "help": "Shows what takes up space in a folder, largest first (--depth N). Sizes of files changed in place are only picked up with --rescan.", "category": "File"},
     # User
     "whoami": {"func": _whoami_logic, "help": "Displays your username.", "category": "User"},
-    "user": {"func": _user_logic, "help": "Manages users (add, delete). Admin only.", "category": "User"},
+    "user": {"func": _user_logic, "help": "Manages users (add, delete, fs). Admin only.", "category": "User"},
     "changepass": {"func": _changepass_logic, "help": "Change your password.", "category": "User"},
     "switchuser": {"func": _switchuser_logic, "help": "Switch to another user account.", "category": "User"},
     # App
-    "convert": {"func": convert_command, "help": "Converts a folder to a .pyhx package (e.g. convert -pyhx <folder>).", "category": "App"},
+    "convert": {"func": convert_command, "help": "Converts a folder to a .pyhx package (--watch to rebuild on change), or a .pyhxd update with -delta.", "category": "App"},
     "install": {"func": install_command, "help": "Installs a .pyhx package from the staging area.", "category": "App"},
+    "update": {"func": update_command, "help": "Applies a .pyhxd update from the staging area to an installed package.", "category": "App"},
     "run": {"func": run_command, "help": "Runs an installed .pyhx package.", "category": "App"},
+    "verify": {"func": verify_command, "help": "Checks installed packages for corruption (all, or the ones named).", "category": "App"},
     "store-gui": {"func": store_gui_command, "help": "Opens the App Store to find new packages.", "category": "App"},
     "h7t": {"func": h7t_command, "help": "Shortcut to run the H7T app.", "category": "App"},
     # Tools
     "net": {"func": _net_logic, "help": "Network tools (ping, lookup, get).", "category": "Tools"},
-    "calc": {"func": _calc_logic, "help": "A simple calculator.", "category": "Tools"},
+    "calc": {"func": _calc_logic, "help": "A calculator with variables and math functions (calc --each <expr> <file> for files).", "category": "Tools"},
     "calendar": {"func": _calendar_logic, "help": "Displays a calendar for the current month.", "category": "Tools"},
     "roll": {"func": _roll_logic, "help": "Rolls a six-sided die.", "category": "Tools"},
     "cowsay": {"func": _cowsay_logic, "help": "An ASCII cow says your message.", "category": "Tools"},
@@ -548,32 +1275,48 @@ def ensure_dirs_exist():
     os.makedirs(PACKAGES_DIR, exist_ok=True)
     os.makedirs(INSTALLED_DIR, exist_ok=True)
 
-def authenticate(is_su=False):
-    """Handles the user selection and login process."""
+def _login_menu(is_su=False):
+    """Prints the welcome banner and the user list. Returns the usernames in menu order."""
     if not is_su:
         print("--- Welcome to PyHx OS ---")
-    users = load_users()
-    user_list = list(users.keys())
+    user_list = list(load_users().keys())
     print("Please select a user:")
     for i, username in enumerate(user_list):
         print(f"  {i+1}. {username}")
+    return user_list
+
+def _choose_user(user_list, choice_text):
+    """Turns the number typed at the login menu into a username, or None."""
     try:
-        choice = int(input("Enter number: ")) - 1
-        if not 0 <= choice < len(user_list):
-            print("Invalid selection.")
-            return None
-        username = user_list[choice]
-        password = getpass.getpass(f"Password for {username}: ")
-        if hash_password(password) == users[username]['password']:
-            if not is_su:
-                print(f"\nLogin successful. Welcome, {username}!")
-            return {"name": username, "role": users[username]['role']}
-        else:
-            print("\nAuthentication failed.")
-            return None
-    except (ValueError, IndexError):
+        choice = int(choice_text) - 1
+    except ValueError:
         print("Invalid input.")
         return None
+    if not 0 <= choice < len(user_list):
+        print("Invalid selection.")
+        return None
+    return user_list[choice]
+
+def check_password(username, password, is_su=False):
+    """Checks a login attempt. Returns the user on success, or None."""
+    users = load_users()
+    if username in users and hash_password(password) == users[username]['password']:
+        user = {"name": username, "role": users[username]['role'], "fs": users[username].get('fs', 'host')}
+        audit('login', user, ok=True, switch=is_su)
+        if not is_su:
+            print(f"\nLogin successful. Welcome, {username}!")
+        return user
+    audit('login', {"name": username}, ok=False, switch=is_su)
+    print("\nAuthentication failed.")
+    return None
+
+def authenticate(is_su=False):
+    """Handles the user selection and login process."""
+    user_list = _login_menu(is_su)
+    username = _choose_user(user_list, prompt_input("Enter number: "))
+    if username is None:
+        return None
+    return check_password(username, prompt_password(f"Password for {username}: "), is_su)
 
 def parse_input(raw_input_str):
     """New parser to handle I/O redirection."""
@@ -593,6 +1336,178 @@ def parse_input(raw_input_str):
     args = parts[1:]
     return command, args, outfile, append
 
+def shell_prompt(user, cwd):
+    """Builds the shell prompt for a user in a directory."""
+    return f"{user['name']}@{get_hostname()}:{os.path.basename(cwd) or cwd}$ "
+
+def dispatch(raw_input_str, user):
+    """Records and executes one line of shell input. Returns (running, user)."""
+    current_history().append(raw_input_str)
+    command, args, outfile, append = parse_input(raw_input_str)
+    if command not in COMMANDS:
+        # Not logging the arguments, in case a mistyped command carried a password
+        audit('command', user, command=command, found=False)
+        print(f"PyHx: command not found: {command}")
+        return True, user
+    start = time.perf_counter()
+    try:
+        if command == 'say':
+            return COMMANDS[command]['func'](args, user, outfile, append)
+        if outfile:
+            print("Error: Redirection `>` is only supported for the 'say' command.")
+        return COMMANDS[command]['func'](args, user)
+    finally:
+        audit('command', user, command=command, args=_audit_args(command, args),
+              duration=round(time.perf_counter() - start, 4))
+
+# --- Server Mode ---
+class ServerSession:
+    """Per-connection state for `main.py --serve`: socket I/O, user, cwd and history.
+
+    The event loop owns the socket. Commands run on a shared worker pool and
+    reach the client through write() and read_line(), which hop back onto the
+    loop thread. Every prompt is followed by INPUT_MARK or SECRET_MARK so the
+    client knows when to send a line and whether to echo it.
+    """
+
+    def __init__(self, loop, reader, writer, cwd):
+        self.loop = loop
+        self.reader = reader
+        self.writer = writer
+        self.cwd = cwd
+        self.history = []
+        self.filesystems = {}
+        self.calc_vars = {}
+        peer = writer.get_extra_info('peername')
+        self.peer = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else "unix"
+
+    def write(self, text):
+        """Queues text for the client. Safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self.writer.write, text.encode('utf-8'))
+
+    async def request_line(self, prompt, secret=False, timeout=None):
+        """Sends a prompt and waits for the client's reply (on the loop thread)."""
+        import asyncio
+        self.writer.write((prompt + (SECRET_MARK if secret else INPUT_MARK)).encode('utf-8'))
+        await self.writer.drain()
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout)
+        except (asyncio.TimeoutError, ValueError):
+            raise EOFError("session input closed")
+        if not line:
+            raise EOFError("session input closed")
+        return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+    def read_line(self, prompt, secret=False):
+        """
+        Blocking variant of request_line for command worker threads. The
+        caller holds a worker while it waits, so the wait is bounded by
+        PROMPT_TIMEOUT; a client that never answers is disconnected.
+        """
+        import asyncio
+        future = asyncio.run_coroutine_threadsafe(self.request_line(prompt, secret, PROMPT_TIMEOUT), self.loop)
+        return future.result()
+
+    async def login(self, executor):
+        """
+        Runs the login dialogue. Waiting for the client happens on the loop,
+        bounded by LOGIN_TIMEOUT, so connections that never log in hold no
+        worker; only reading users.json and checking the password do.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        user_list = await loop.run_in_executor(executor, self.call, _login_menu)
+        choice = await self.request_line("Enter number: ", timeout=LOGIN_TIMEOUT)
+        username = self.call(_choose_user, user_list, choice)
+        if username is None:
+            return None
+        password = await self.request_line(f"Password for {username}: ", secret=True, timeout=LOGIN_TIMEOUT)
+        return await loop.run_in_executor(executor, self.call, check_password, username, password)
+
+    def call(self, func, *args):
+        """Runs func on the current worker thread with this session bound."""
+        _SESSION.active = self
+        try:
+            return func(*args)
+        finally:
+            _SESSION.active = None
+
+class _SessionStdout:
+    """sys.stdout replacement that sends output of session threads to their client."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        session = current_session()
+        if session is None:
+            return self._stream.write(text)
+        session.write(text)
+        return len(text)
+
+    def flush(self):
+        if current_session() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+async def _handle_client(reader, writer, executor, root_dir):
+    """Serves one client connection from login until shutdown or disconnect."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    session = ServerSession(loop, reader, writer, root_dir)
+    try:
+        user = await session.login(executor)
+        running = user is not None
+        while running:
+            # Idle sessions wait here on the event loop without holding a thread
+            raw_input_str = await session.request_line(shell_prompt(user, get_fs(user, session).getcwd()))
+            if not raw_input_str:
+                continue
+            try:
+                running, user = await loop.run_in_executor(executor, session.call, dispatch, raw_input_str, user)
+            except (EOFError, ConnectionError):
+                raise
+            except Exception as e:
+                session.write(f"An unexpected error occurred: {e}\n")
+    except (EOFError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+        for fs in session.filesystems.values():
+            fs.close()
+
+def serve(unix_path=None, host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS):
+    """Serves concurrent shell sessions over a Unix socket or localhost TCP."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    sys.stdout = _SessionStdout(sys.stdout)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyhx-session")
+    handler = functools.partial(_handle_client, executor=executor, root_dir=os.getcwd())
+
+    async def _serve_forever():
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)  # Stale socket from a previous run
+            server = await asyncio.start_unix_server(handler, path=unix_path)
+            where = unix_path
+        else:
+            server = await asyncio.start_server(handler, host, port)
+            where = f"{host}:{port}"
+        print(f"PyHx server listening on {where}. Press Ctrl+C to stop.")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(_serve_forever())
+    except KeyboardInterrupt:
+        print("\nPyHx server stopped.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if unix_path and os.path.exists(unix_path):
+            os.remove(unix_path)
+
 def main():
     """The main entry point and shell loop."""
     ensure_dirs_exist()
@@ -601,27 +1516,44 @@ def main():
         return
     running = True
     while running:
-        prompt = f"{current_user['name']}@{get_hostname()}:{os.path.basename(os.getcwd())}$ "
+        prompt = shell_prompt(current_user, get_fs(current_user).getcwd())
         try:
             raw_input_str = input(prompt)
             if not raw_input_str:
                 continue
-            COMMAND_HISTORY.append(raw_input_str)
-            command, args, outfile, append = parse_input(raw_input_str)
-            if command in COMMANDS:
-                if command == 'say':
-                    running, current_user = COMMANDS[command]['func'](args, current_user, outfile, append)
-                else:
-                    if outfile:
-                        print("Error: Redirection `>` is only supported for the 'say' command.")
-                    running, current_user = COMMANDS[command]['func'](args, current_user)
-            else:
-                print(f"PyHx: command not found: {command}")
+            running, current_user = dispatch(raw_input_str, current_user)
         except (KeyboardInterrupt, EOFError):
             print("\nUse 'shutdown' to exit.")
             break
 
+def cli(argv=None):
+    """Command-line entry point, shared by main.py and the pyhx.pyz bundle."""
+    parser = argparse.ArgumentParser(description="PyHx OS shell.")
+    parser.add_argument('--serve', action='store_true', help="Serve many shell sessions from one process.")
+    parser.add_argument('--unix', metavar='PATH', help="Listen on a Unix domain socket instead of TCP.")
+    parser.add_argument('--host', default=SERVER_HOST, help=f"TCP address to listen on (default {SERVER_HOST}).")
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help=f"TCP port to listen on (default {SERVER_PORT}).")
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help="Threads for running session commands.")
+    parser.add_argument('--data-dir', default=os.environ.get(HOME_ENV_VAR, DEFAULT_HOME),
+                        help=f"Folder holding config/ and packages/ (default ${HOME_ENV_VAR}, else next to PyHx).")
+    options = parser.parse_args(argv)
+    unix_path = os.path.abspath(options.unix) if options.unix else None
+    sys.argv[0] = os.path.abspath(sys.argv[0])  # Keeps 'restart' working after the chdir below
+    # All config and package paths are relative to the data directory
+    os.makedirs(options.data_dir, exist_ok=True)
+    os.chdir(options.data_dir)
+    # The local shell's 'go' changes the process cwd, so files that commands
+    # open by path must not stay relative to it
+    global INDEX_FILE, USAGE_CACHE_FILE
+    INDEX_FILE = os.path.abspath(INDEX_FILE)
+    USAGE_CACHE_FILE = os.path.abspath(USAGE_CACHE_FILE)
+    AUDIT.start()
+    if options.serve:
+        ensure_dirs_exist()
+        load_users()  # Create the default user up front rather than inside a session
+        serve(unix_path, options.host, options.port, options.workers)
+    else:
+        main()
+
 if __name__ == "__main__":
-    # Set working directory to the script's location for consistency
-    os.chdir(os.path.dirname(os.path.realpath(__file__)))
-    main()
+    cli()
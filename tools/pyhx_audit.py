@@ -0,0 +1,120 @@
+# PyHx/tools/pyhx_audit.py
+
+import os
+import json
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import datetime
+import threading
+
+QUEUE_SIZE = 65536       # Events waiting for the writer; beyond this they are dropped, never blocked on
+BATCH_SIZE = 4096        # Most events written (and flushed) with one write() call
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5              # Compressed logs kept: audit.log.1.gz (newest) to audit.log.5.gz
+
+_STOP = object()
+
+class AuditLog:
+    """
+    A JSON-lines audit log written by a background thread.
+
+    log() only puts a tuple on a bounded queue, so callers never wait for
+    the disk. The writer thread formats whatever has queued up, writes it
+    as one batch and flushes. When the file grows past max_bytes it is
+    gzipped to <path>.1.gz and older logs move up one number.
+    """
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, backups=BACKUPS, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._drop_lock = threading.Lock()
+        self._thread = None
+
+    def start(self, path=None):
+        """Starts the writer thread. Events logged before this are kept in the queue."""
+        if self._thread:
+            return
+        self.path = os.path.abspath(path or self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="pyhx-audit", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, event, **fields):
+        """Records an event. Never blocks; if the queue is full the event is counted as dropped."""
+        try:
+            self._queue.put_nowait((time.time(), event, fields))
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    def close(self):
+        """Writes out everything still queued and stops the writer."""
+        if not self._thread or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=10)
+
+    def _run(self):
+        stream = None
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is _STOP
+                lines = [_format(record) for record in batch if record is not _STOP]
+                if self.dropped:
+                    with self._drop_lock:
+                        dropped, self.dropped = self.dropped, 0
+                    lines.append(_format((time.time(), 'audit_dropped', {'count': dropped})))
+                # A full or read-only disk must not stop the shell: the batch is
+                # lost, and the file is reopened for the next one.
+                try:
+                    if stream is None:
+                        stream = open(self.path, 'a', encoding='utf-8')
+                    stream.write(''.join(lines))
+                    stream.flush()
+                    if stream.tell() >= self.max_bytes:
+                        stream.close()
+                        stream = None
+                        self._rotate()
+                except (OSError, ValueError):
+                    if stream is not None:
+                        try:
+                            stream.close()
+                        except (OSError, ValueError):
+                            pass
+                    stream = None
+                if stopping:
+                    return
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def _rotate(self):
+        """Compresses the current log to .1.gz, shifting older ones and deleting the oldest."""
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}.gz"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}.gz")
+        rotating = self.path + ".rotating"
+        if not os.path.exists(rotating):  # Else finish the one a failed rotation left behind
+            os.replace(self.path, rotating)
+        with open(rotating, 'rb') as source, gzip.open(f"{self.path}.1.gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(rotating)
+
+def _format(record):
+    timestamp, event, fields = record
+    when = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(timespec='milliseconds')
+    return json.dumps(dict({'time': when, 'event': event}, **fields), default=str) + '\n'
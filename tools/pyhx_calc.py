@@ -0,0 +1,216 @@
+# PyHx/tools/pyhx_calc.py
+
+import ast
+import math
+import decimal
+import fractions
+import functools
+import itertools
+
+MODES = ('float', 'decimal', 'fraction')
+MAX_EXPONENT = 10000     # Refuse '9**9**9' style expressions that would hang the shell
+MAX_RESULT_BITS = 100000 # ...and powers whose exact result would be larger than this
+MAX_FACTORIAL = 10000
+MAX_PRECISION = 1000     # Digits allowed for --decimal --prec; exp/ln slow down sharply beyond this
+BLOCK_LINES = 4096       # Lines evaluated per block in batch mode
+
+_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+
+def _bit_length(value):
+    """Size in bits of an exact value (int or Fraction); None for inexact types, which overflow on their own."""
+    if isinstance(value, int):
+        return abs(value).bit_length()
+    if isinstance(value, fractions.Fraction):
+        return max(abs(value.numerator).bit_length(), value.denominator.bit_length())
+    return None
+
+def _safe_pow(base, exponent):
+    if abs(exponent) > MAX_EXPONENT:
+        raise OverflowError(f"exponent larger than {MAX_EXPONENT}")
+    bits = _bit_length(base)
+    if bits is not None and abs(exponent) * bits > MAX_RESULT_BITS:
+        raise OverflowError(f"result larger than {MAX_RESULT_BITS} bits")
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise ValueError("result is not a real number")
+    return result
+
+def _safe_factorial(n):
+    if n > MAX_FACTORIAL:
+        raise OverflowError(f"factorial argument larger than {MAX_FACTORIAL}")
+    return math.factorial(n)
+
+def _decimal_log(value, base=None):
+    value = decimal.Decimal(value)
+    return value.ln() if base is None else value.ln() / decimal.Decimal(base).ln()
+
+_FLOAT_NAMES = {
+    'abs': abs, 'round': round, 'min': min, 'max': max,
+    'sqrt': math.sqrt, 'exp': math.exp, 'log': math.log, 'log10': math.log10, 'log2': math.log2,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'asin': math.asin, 'acos': math.acos,
+    'atan': math.atan, 'atan2': math.atan2, 'floor': math.floor, 'ceil': math.ceil,
+    'factorial': _safe_factorial, 'hypot': math.hypot,
+    'pi': math.pi, 'e': math.e, 'tau': math.tau,
+}
+
+_DECIMAL_NAMES = dict(_FLOAT_NAMES, **{
+    'sqrt': lambda v: decimal.Decimal(v).sqrt(),
+    'exp': lambda v: decimal.Decimal(v).exp(),
+    'log': _decimal_log,
+    'log10': lambda v: decimal.Decimal(v).log10(),
+    'pi': decimal.Decimal('3.141592653589793238462643383'),
+    'e': decimal.Decimal(1).exp(),
+    'tau': 2 * decimal.Decimal('3.141592653589793238462643383'),
+})
+
+_FRACTION_NAMES = dict(_FLOAT_NAMES, **{
+    'pi': fractions.Fraction(math.pi), 'e': fractions.Fraction(math.e), 'tau': fractions.Fraction(math.tau),
+})
+
+NAMES = {'float': _FLOAT_NAMES, 'decimal': _DECIMAL_NAMES, 'fraction': _FRACTION_NAMES}
+
+def parse_number(text, mode='float'):
+    """Parses a numeric token in the given precision mode."""
+    if mode == 'decimal':
+        return decimal.Decimal(text)
+    if mode == 'fraction':
+        return fractions.Fraction(text)
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+class _Rewriter(ast.NodeTransformer):
+    """Checks an expression against the allowed subset and rewrites it for evaluation."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.variables = set()
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Constant, ast.Name, ast.Load)
+                          + _BINARY_OPS + _UNARY_OPS):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in expressions")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ValueError("only numbers are allowed in expressions")
+        if self.mode == 'float':
+            return node
+        # Re-read literals from their shortest repr so 0.1 stays exactly 0.1
+        helper = '_Decimal' if self.mode == 'decimal' else '_Fraction'
+        return ast.copy_location(ast.Call(ast.Name(helper, ast.Load()), [ast.Constant(repr(node.value))], []), node)
+
+    def visit_Name(self, node):
+        if node.id.startswith('_'):
+            raise ValueError(f"name '{node.id}' is not allowed")
+        if node.id not in NAMES[self.mode]:
+            self.variables.add(node.id)
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or not callable(NAMES[self.mode].get(node.func.id)) or node.keywords:
+            raise ValueError("only plain calls to math functions are allowed")
+        return self.generic_visit(node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(ast.Call(ast.Name('_pow', ast.Load()), [node.left, node.right], []), node)
+        return node
+
+class CompiledExpression:
+    """An expression compiled to a plain Python function of its variables."""
+
+    def __init__(self, text, mode, func, variables):
+        self.text = text
+        self.mode = mode
+        self.func = func
+        self.variables = variables
+
+    def __call__(self, env):
+        """Evaluates with variables taken from the env mapping."""
+        return self.bind(env)()
+
+    def bind(self, env, free=None):
+        """
+        Returns a function of the `free` variable (or of nothing) with every
+        other variable fixed from env, e.g. bind(env, 'x') for batch mode.
+        """
+        missing = [name for name in self.variables if name not in env and name != free]
+        if missing:
+            raise NameError(f"name '{missing[0]}' is not defined")
+        if self.variables == (free,):
+            return self.func  # Batch fast path: map() calls the compiled lambda directly
+        call = functools.partial(self.func, **{name: env[name] for name in self.variables if name != free})
+        if free is None:
+            return call
+        if free in self.variables:
+            return lambda value: call(**{free: value})
+        return lambda value: call()
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(text, mode='float'):
+    """Validates an expression and compiles it once; results are cached by (text, mode)."""
+    if mode not in MODES:
+        raise ValueError(f"unknown mode '{mode}'")
+    tree = ast.parse(text.strip(), mode='eval')
+    rewriter = _Rewriter(mode)
+    body = rewriter.visit(tree).body
+    variables = tuple(sorted(rewriter.variables))
+    # Variables become parameters of a lambda, so evaluation is a single
+    # Python call with no dictionary lookups per name.
+    lam = ast.Lambda(ast.arguments(posonlyargs=[], args=[ast.arg(name) for name in variables], vararg=None,
+                                   kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]), body)
+    code = compile(ast.fix_missing_locations(ast.Expression(lam)), '<calc>', 'eval')
+    scope = dict(NAMES[mode], _pow=_safe_pow, _Decimal=decimal.Decimal, _Fraction=fractions.Fraction,
+                 __builtins__={})
+    return CompiledExpression(text, mode, eval(code, scope), variables)
+
+def line_value(line, column=None, mode='float'):
+    """Extracts the numeric value of a line, or of its 1-based column (comma or whitespace separated)."""
+    if column is None:
+        return parse_number(line.strip(), mode)
+    return parse_number(line.replace(',', ' ').split()[column - 1], mode)
+
+def evaluate_lines(expression, lines, env=None, column=None, mode='float'):
+    """
+    Applies an expression to every line of an iterable, binding each value to `x`.
+
+    Lines are processed in blocks so the compiled function runs in a tight map();
+    yields (line_number, result) for numeric lines and (line_number, None) for
+    lines that hold no number. Evaluation errors are yielded as exceptions.
+    """
+    func = compile_expression(expression, mode).bind(env or {}, free='x')
+    parse = functools.partial(line_value, column=column, mode=mode)
+    numbered = enumerate(lines, 1)
+    while True:
+        block = list(itertools.islice(numbered, BLOCK_LINES))
+        if not block:
+            return
+        try:
+            values = list(zip((number for number, _ in block), map(parse, (line for _, line in block))))
+        except (ValueError, IndexError, ArithmeticError):
+            # Some lines are blank or non-numeric; parse this block one line at a time
+            values = []
+            for number, line in block:
+                try:
+                    values.append((number, parse(line)))
+                except (ValueError, IndexError, ArithmeticError):
+                    if line.strip():
+                        values.append((number, None))
+        numeric = [value for _, value in values if value is not None]
+        try:
+            results = iter(list(map(func, numeric)))
+        except (ArithmeticError, ValueError, TypeError):
+            results = iter([_safe_call(func, value) for value in numeric])
+        for number, value in values:
+            yield number, (None if value is None else next(results))
+
+def _safe_call(func, value):
+    try:
+        return func(value)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        return e
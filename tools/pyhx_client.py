@@ -0,0 +1,63 @@
+# PyHx/tools/pyhx_client.py
+
+import sys
+import socket
+import getpass
+import argparse
+
+# Must match INPUT_MARK / SECRET_MARK in main.py
+INPUT_MARK = b'\x1f'
+SECRET_MARK = b'\x1e'
+
+def connect(unix_path=None, host='127.0.0.1', port=8765):
+    """Opens a connection to a PyHx server started with 'main.py --serve'."""
+    if unix_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(unix_path)
+    else:
+        sock = socket.create_connection((host, port))
+    return sock
+
+def run_session(sock):
+    """
+    Relays server output to the terminal and answers its prompts.
+
+    The server ends every prompt with a marker byte; only then does it expect
+    a line back, so a plain blocking loop is enough.
+    """
+    out = sys.stdout.buffer
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        while chunk:
+            marks = [i for i in (chunk.find(INPUT_MARK), chunk.find(SECRET_MARK)) if i != -1]
+            if not marks:
+                out.write(chunk)
+                break
+            idx = min(marks)
+            out.write(chunk[:idx])
+            out.flush()
+            secret = chunk[idx:idx + 1] == SECRET_MARK
+            chunk = chunk[idx + 1:]
+            line = getpass.getpass('') if secret else input()
+            sock.sendall((line + '\n').encode('utf-8'))
+        out.flush()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Connect to a PyHx server session.")
+    parser.add_argument('--unix', metavar='PATH', help="Unix domain socket of the server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    options = parser.parse_args()
+    try:
+        connection = connect(options.unix, options.host, options.port)
+    except OSError as e:
+        print(f"Error: Could not connect to PyHx server. {e}")
+        sys.exit(1)
+    try:
+        run_session(connection)
+    except (KeyboardInterrupt, EOFError, ConnectionError):
+        print()
+    finally:
+        connection.close()
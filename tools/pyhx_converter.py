@@ -2,9 +2,69 @@
 
 import sys
 import os
+import json
 import shutil
+import hashlib
+import tempfile
+import zipfile
+import zlib
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
 
-def create_pyhx_package(source_folder, output_dir):
+# Delta packages (.pyhxd) are zip archives holding DELTA_MANIFEST plus every
+# added or changed entry under DELTA_PREFIX. Package versions are identified
+# by package_digest(), a hash over entry names and contents, so the same app
+# content always has the same identity regardless of zip timestamps.
+DELTA_MANIFEST = 'delta.json'
+DELTA_PREFIX = 'files/'
+# Every package also carries HASHES_NAME, mapping each other entry to the
+# sha256 of its content, so installs and launches can detect corruption.
+HASHES_NAME = '.pyhx-hashes.json'
+WATCH_INTERVAL = 0.5     # Seconds between polls when inotify is unavailable
+
+def entry_hashes(archive):
+    """Returns {entry name: sha256 hex digest} for every entry of an open ZipFile."""
+    return {info.filename: hashlib.sha256(archive.read(info)).hexdigest() for info in archive.infolist()}
+
+def package_digest(hashes):
+    """Combines per-entry hashes into one digest identifying a package version."""
+    combined = hashlib.sha256()
+    for name in sorted(hashes):
+        combined.update(f"{name}\0{hashes[name]}\n".encode('utf-8'))
+    return combined.hexdigest()
+
+def write_entry_hashes(pyhx_path):
+    """Records the hash of every entry in the package itself."""
+    with zipfile.ZipFile(pyhx_path, 'a', zipfile.ZIP_DEFLATED) as archive:
+        hashes = entry_hashes(archive)
+        hashes.pop(HASHES_NAME, None)
+        archive.writestr(HASHES_NAME, json.dumps(hashes, indent=4, sort_keys=True))
+
+def read_entry_hashes(archive):
+    """
+    Returns the recorded entry hashes of an open package, or None for packages
+    built without them. Raises ValueError if the hash manifest is damaged.
+    """
+    if HASHES_NAME not in archive.namelist():
+        return None
+    try:
+        hashes = json.loads(archive.read(HASHES_NAME).decode('utf-8'))
+    except ValueError as e:  # Also covers UnicodeDecodeError and JSONDecodeError
+        raise ValueError(f"'{HASHES_NAME}' is not valid JSON") from e
+    if not isinstance(hashes, dict) or not all(isinstance(name, str) and isinstance(digest, str)
+                                               for name, digest in hashes.items()):
+        raise ValueError(f"'{HASHES_NAME}' does not map entry names to hashes")
+    return hashes
+
+def read_delta_manifest(delta_path):
+    """Returns the parsed manifest of a delta package."""
+    with zipfile.ZipFile(delta_path) as delta:
+        return json.loads(delta.read(DELTA_MANIFEST).decode('utf-8'))
+
+def create_pyhx_package(source_folder, output_dir, verbose=True):
     """
     Validates the source folder and compresses it into a .pyhx file.
 
@@ -34,6 +94,8 @@ def create_pyhx_package(source_folder, output_dir):
             format=archive_format,       # The archive format ('zip', 'tar', etc.)
             root_dir=source_folder       # The directory to archive
         )
+        # Record per-entry hashes so installs and launches can verify the package
+        write_entry_hashes(output_filename)
     except Exception as e:
         print(f"Error: Failed to create archive. {e}")
         return
@@ -43,15 +105,278 @@ def create_pyhx_package(source_folder, output_dir):
     try:
         # Rename 'my_app.zip' to 'my_app.pyhx'
         os.rename(output_filename, final_pyhx_path)
-        print(f"Successfully created '{final_pyhx_path}'")
+        if verbose:
+            print(f"Successfully created '{final_pyhx_path}'")
     except Exception as e:
         print(f"Error: Failed to rename/move archive. {e}")
 
+def create_delta_package(base_pyhx, source_folder, output_dir):
+    """
+    Packages source_folder and stores only its differences from base_pyhx.
+
+    The delta records the digest of the base it applies to and of the
+    package it produces, so 'update' can refuse a mismatched base and
+    verify its result.
+    """
+    if not os.path.isfile(base_pyhx):
+        print(f"Error: Base package '{base_pyhx}' not found.")
+        return
+    work_dir = tempfile.mkdtemp(prefix="pyhx_delta_", dir=output_dir)
+    try:
+        create_pyhx_package(source_folder, work_dir, verbose=False)
+        package_name = os.path.basename(base_pyhx)
+        built = [name for name in os.listdir(work_dir) if name.endswith('.pyhx')]
+        if not built:
+            return
+        with zipfile.ZipFile(base_pyhx) as base, zipfile.ZipFile(os.path.join(work_dir, built[0])) as new:
+            base_hashes, new_hashes = entry_hashes(base), entry_hashes(new)
+            changed = [name for name in new.namelist() if base_hashes.get(name) != new_hashes[name]]
+            removed = sorted(set(base_hashes) - set(new_hashes))
+            manifest = {
+                "package": package_name,
+                "base": package_digest(base_hashes),
+                "target": package_digest(new_hashes),
+                "removed": removed,
+            }
+            delta_path = os.path.join(output_dir, os.path.splitext(package_name)[0] + '.pyhxd')
+            with zipfile.ZipFile(delta_path, 'w', zipfile.ZIP_DEFLATED) as delta:
+                delta.writestr(DELTA_MANIFEST, json.dumps(manifest, indent=4))
+                for name in changed:
+                    delta.writestr(DELTA_PREFIX + name, new.read(name))
+        print(f"Successfully created '{delta_path}' ({len(changed)} changed, {len(removed)} removed)")
+    except (zipfile.BadZipFile, OSError) as e:
+        print(f"Error: Failed to create delta package. {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def apply_delta_package(base_pyhx, delta_path, output_path):
+    """
+    Writes base_pyhx with the delta applied to output_path.
+
+    Raises ValueError if the base is not the version the delta was made from,
+    or if the result does not match the delta's target digest.
+    """
+    with zipfile.ZipFile(delta_path) as delta, zipfile.ZipFile(base_pyhx) as base:
+        manifest = json.loads(delta.read(DELTA_MANIFEST).decode('utf-8'))
+        changed = [name[len(DELTA_PREFIX):] for name in delta.namelist() if name.startswith(DELTA_PREFIX)]
+        skip = set(changed) | set(manifest['removed'])
+        base_hashes, result_hashes = {}, {}
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as out:
+            # Hash the base while copying it, so it is only read once
+            for info in base.infolist():
+                data = base.read(info)
+                base_hashes[info.filename] = hashlib.sha256(data).hexdigest()
+                if info.filename not in skip:
+                    out.writestr(info, data)
+                    result_hashes[info.filename] = base_hashes[info.filename]
+            if package_digest(base_hashes) != manifest['base']:
+                raise ValueError("the installed package is not the version this update was made for")
+            for name in changed:
+                data = delta.read(DELTA_PREFIX + name)
+                out.writestr(name, data, zipfile.ZIP_DEFLATED)
+                result_hashes[name] = hashlib.sha256(data).hexdigest()
+    if package_digest(result_hashes) != manifest['target']:
+        raise ValueError("the updated package failed verification")
+
+
+# --- Watch Mode ---
+# While watching, every entry is kept compressed in memory. A rebuild only
+# reads and recompresses files whose mtime or size changed; the archive is then
+# written straight from the cached compressed bytes.
+class _RawEntry:
+    """One archive entry with its already-deflated data."""
+
+    def __init__(self, name, stat, data=b''):
+        self.name = name
+        self.size = len(data)
+        self.crc = zlib.crc32(data)
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        is_dir = name.endswith('/')
+        if is_dir:
+            self.method, self.data = zipfile.ZIP_STORED, b''
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            self.method, self.data = zipfile.ZIP_DEFLATED, compressor.compress(data) + compressor.flush()
+        self.external_attr = ((stat.st_mode & 0xFFFF) << 16) | (0x10 if is_dir else 0)
+        year, month, day, hour, minute, second = time.localtime(stat.st_mtime)[:6]
+        if year < 1980:
+            year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+        self.dos_date = (year - 1980) << 9 | month << 5 | day
+        self.dos_time = hour << 11 | minute << 5 | second // 2
+
+def _write_raw_zip(path, entries):
+    """Writes pre-compressed entries as a zip archive (entries must stay below 4 GiB, no ZIP64)."""
+    with open(path, 'wb') as f:
+        central = []
+        for entry in entries:
+            offset = f.tell()
+            name = entry.name.encode('utf-8')
+            f.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, 0x800, entry.method, entry.dos_time,
+                                entry.dos_date, entry.crc, len(entry.data), entry.size, len(name), 0))
+            f.write(name)
+            f.write(entry.data)
+            central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 20, 20, 0x800, entry.method,
+                                       entry.dos_time, entry.dos_date, entry.crc, len(entry.data), entry.size,
+                                       len(name), 0, 0, 0, 0, entry.external_attr, offset) + name)
+        central_offset = f.tell()
+        for record in central:
+            f.write(record)
+        f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(central), len(central),
+                            f.tell() - central_offset, central_offset, 0))
+
+class IncrementalPackage:
+    """A package rebuilt from source_folder, recompressing only what changed since the last refresh."""
+
+    def __init__(self, source_folder):
+        self.source_folder = source_folder
+        self.snapshot = {}
+        self.entries = {}
+
+    def _scan(self):
+        """Maps archive names to (mtime_ns, size) for everything under the source folder."""
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(self.source_folder):
+            rel = os.path.relpath(dirpath, self.source_folder)
+            prefix = '' if rel == os.curdir else rel.replace(os.sep, '/') + '/'
+            # '' stands for the directory entry itself (the root folder has none)
+            for name in ([''] + filenames) if prefix else filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue  # Deleted while scanning; the next refresh will catch up
+                if prefix + name != HASHES_NAME:
+                    snapshot[prefix + name] = (stat.st_mtime_ns, stat.st_size if name else 0)
+        return snapshot
+
+    def refresh(self):
+        """Rescans the source tree and returns the names of changed or removed files."""
+        snapshot = self._scan()
+        touched = []
+        for name, stamp in snapshot.items():
+            if self.snapshot.get(name) != stamp:
+                path = os.path.join(self.source_folder, *name.rstrip('/').split('/'))
+                try:
+                    stat = os.stat(path)
+                    data = b''
+                    if not name.endswith('/'):
+                        with open(path, 'rb') as f:
+                            data = f.read()
+                except (FileNotFoundError, IsADirectoryError):
+                    snapshot.pop(name)
+                    continue
+                self.entries[name] = _RawEntry(name, stat, data)
+                touched.append(name)
+        for name in set(self.snapshot) - set(snapshot):
+            self.entries.pop(name, None)
+            touched.append(name)
+        self.snapshot = snapshot
+        return [name for name in touched if not name.endswith('/')]
+
+    def directories(self):
+        return [self.source_folder] + [os.path.join(self.source_folder, *name.rstrip('/').split('/'))
+                                       for name in self.entries if name.endswith('/')]
+
+    def write(self, path):
+        """Writes the package (with its entry hashes) to path atomically."""
+        entries = [self.entries[name] for name in sorted(self.entries)]
+        hashes = {entry.name: entry.sha256 for entry in entries}
+        hashes_data = json.dumps(hashes, indent=4, sort_keys=True).encode('utf-8')
+        entries.append(_RawEntry(HASHES_NAME, os.stat(self.source_folder), hashes_data))
+        # The hashes entry takes the folder's mode; give it a plain file mode instead
+        entries[-1].external_attr = 0o100644 << 16
+        temp_path = path + ".tmp"
+        _write_raw_zip(temp_path, entries)
+        os.replace(temp_path, path)
+
+class _Inotify:
+    """Minimal inotify binding used to sleep until the source tree changes (Linux only)."""
+
+    MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200  # MODIFY ATTRIB CLOSE_WRITE MOVED_* CREATE DELETE
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def watch(self, directories):
+        # Re-adding an existing watch is harmless, so new folders are picked up here
+        for directory in directories:
+            self._add_watch(self.fd, os.fsencode(directory), self.MASK)
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            time.sleep(0.02)  # Let editors finish multi-step saves before rescanning
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+def watch_package(source_folder, output_dir, interval=WATCH_INTERVAL, on_build=None):
+    """
+    Rebuilds source_folder into output_dir whenever it changes, until interrupted.
+
+    Uses inotify where available and falls back to polling mtimes every
+    `interval` seconds. on_build(path) is called after each rebuild.
+    """
+    if not os.path.isdir(source_folder):
+        print(f"Error: Source '{source_folder}' is not a valid directory.")
+        return
+    folder_name = os.path.basename(os.path.normpath(source_folder))
+    final_pyhx_path = os.path.join(output_dir, f"{folder_name}.pyhx")
+    package = IncrementalPackage(source_folder)
+    try:
+        notifier = _Inotify() if sys.platform.startswith('linux') else None
+    except (OSError, AttributeError):
+        notifier = None
+    print(f"Watching '{source_folder}' for changes ({'inotify' if notifier else 'polling'}). Press Ctrl+C to stop.")
+    first = True
+    try:
+        while True:
+            start = time.perf_counter()
+            changed = package.refresh()
+            if changed or first:
+                if 'main.py' not in package.entries:
+                    print(f"Error: Source folder '{source_folder}' must contain a 'main.py' file.")
+                else:
+                    package.write(final_pyhx_path)
+                    if on_build:
+                        on_build(final_pyhx_path)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    print(f"Rebuilt '{final_pyhx_path}' ({len(changed)} file(s) updated) in {elapsed:.1f} ms")
+                first = False
+            if notifier:
+                notifier.watch(package.directories())
+                notifier.wait(timeout=5)
+            else:
+                time.sleep(interval)
+    finally:
+        if notifier:
+            notifier.close()
 
 if __name__ == '__main__':
     # This part allows the script to be run from the command line
-    if len(sys.argv) != 2:
+    if len(sys.argv) == 4 and sys.argv[1] == '--delta':
+        os.makedirs('packages', exist_ok=True)
+        create_delta_package(sys.argv[2], sys.argv[3], 'packages')
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == '--watch':
+        output_directory = os.path.join('packages', 'installed') if '--install' in sys.argv[3:] else 'packages'
+        os.makedirs(output_directory, exist_ok=True)
+        try:
+            watch_package(sys.argv[2], output_directory)
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+    elif len(sys.argv) != 2:
         print("Usage: python pyhx_converter.py /path/to/folder")
+        print("       python pyhx_converter.py --delta /path/to/base.pyhx /path/to/folder")
+        print("       python pyhx_converter.py --watch /path/to/folder [--install]")
     else:
         source_directory = sys.argv[1]
         # For now, let's place the output in a 'packages' directory relative to where the command is run
@@ -0,0 +1,173 @@
+# PyHx/tools/pyhx_index.py
+
+import os
+import re
+import array
+import sqlite3
+
+TOKEN_RE = re.compile(r"\w+")
+BINARY_SNIFF = 8192      # Files with a NUL byte in their first bytes are skipped as binary
+MAX_TOKEN_LENGTH = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id    INTEGER PRIMARY KEY,
+    path  TEXT NOT NULL UNIQUE,
+    mtime INTEGER NOT NULL,
+    size  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term  TEXT NOT NULL,
+    file  INTEGER NOT NULL,
+    lines BLOB NOT NULL,
+    PRIMARY KEY (term, file)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_file ON postings (file);
+"""
+
+def tokenize(text):
+    """Splits text into the lowercase terms the index stores."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+def _line_postings(path):
+    """Returns {term: array of line numbers} for a text file, or None if it looks binary."""
+    with open(path, 'rb') as f:
+        if b'\0' in f.read(BINARY_SNIFF):
+            return None
+    postings = {}
+    findall = TOKEN_RE.findall
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for number, line in enumerate(f, 1):
+            for term in set(findall(line.lower())):
+                try:
+                    postings[term].append(number)
+                except KeyError:
+                    postings[term] = array.array('I', (number,))
+    return {term: lines for term, lines in postings.items() if len(term) <= MAX_TOKEN_LENGTH}
+
+class TextIndex:
+    """
+    A persistent inverted index mapping each term to the files and line
+    numbers it appears on. Files are re-tokenized only when their mtime or
+    size changed since they were last indexed.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def build(self, root):
+        """Indexes (or refreshes) every file under root. Returns (added, updated, removed, unchanged)."""
+        root = os.path.abspath(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        known = {path: (file_id, mtime, size) for file_id, path, mtime, size in self._db.execute(
+            "SELECT id, path, mtime, size FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+        added = updated = unchanged = 0
+        seen = set()
+        with self._db:
+            for dirpath, dirnames, filenames in os.walk(root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    seen.add(path)
+                    previous = known.get(path)
+                    if previous and previous[1:] == (stat.st_mtime_ns, stat.st_size):
+                        unchanged += 1
+                        continue
+                    try:
+                        postings = _line_postings(path)
+                    except OSError:
+                        continue
+                    if previous:
+                        self._forget(previous[0])
+                    if postings is None:
+                        continue  # Binary file
+                    file_id = self._db.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                                               (path, stat.st_mtime_ns, stat.st_size)).lastrowid
+                    self._db.executemany("INSERT INTO postings (term, file, lines) VALUES (?, ?, ?)",
+                                         ((term, file_id, postings[term].tobytes()) for term in sorted(postings)))
+                    if previous:
+                        updated += 1
+                    else:
+                        added += 1
+            removed = [entry[0] for path, entry in known.items() if path not in seen]
+            for file_id in removed:
+                self._forget(file_id)
+        return added, updated, len(removed), unchanged
+
+    def _forget(self, file_id):
+        self._db.execute("DELETE FROM postings WHERE file = ?", (file_id,))
+        self._db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _candidates(self, terms):
+        """
+        Returns {path: (line numbers holding every term, mtime, size)} from the
+        index alone, or {path: None} for every file when there are no terms.
+        """
+        matches = None
+        for term in terms:
+            found = {}
+            for file_id, blob in self._db.execute("SELECT file, lines FROM postings WHERE term = ?", (term,)):
+                if matches is None or file_id in matches:
+                    lines = array.array('I')
+                    lines.frombytes(blob)
+                    found[file_id] = set(lines) if matches is None else matches[file_id] & set(lines)
+            matches = {file_id: lines for file_id, lines in found.items() if lines}
+            if not matches:
+                return {}
+        if matches is None:
+            # Regex-only query: every indexed file is a candidate, every line is checked
+            return {path: None for (path,) in self._db.execute("SELECT path FROM files")}
+        paths = {}
+        for file_id, lines in matches.items():
+            row = self._db.execute("SELECT path, mtime, size FROM files WHERE id = ?", (file_id,)).fetchone()
+            paths[row[0]] = (lines, row[1], row[2])
+        return paths
+
+    def search(self, terms, patterns=()):
+        """
+        Yields (path, line number, line) for lines containing all terms and
+        matching all regex patterns. Term hits come from the index; files that
+        changed since indexing, and regex patterns, are checked against the
+        candidate files' current content.
+        """
+        words = terms
+        terms = [token for term in words for token in tokenize(term)]
+        if words and not terms:
+            # Only a pure regex query may match every indexed line
+            raise ValueError("the search words contain nothing searchable (letters, digits or '_')")
+        regexes = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        for path, candidate in sorted(self._candidates(terms).items()):
+            lines = None
+            try:
+                if candidate is not None:
+                    lines, mtime, size = candidate
+                    stat = os.stat(path)
+                    if (stat.st_mtime_ns, stat.st_size) != (mtime, size):
+                        lines = None  # Stale entry: fall back to checking every line
+                for number, text in _read_lines(path, lines):
+                    if lines is None and terms and not set(terms) <= set(tokenize(text)):
+                        continue
+                    if all(regex.search(text) for regex in regexes):
+                        yield path, number, text.rstrip('\r\n')
+            except OSError:
+                continue
+
+def _read_lines(path, wanted=None):
+    """Yields (number, line) for all lines, or only the wanted line numbers, stopping after the last one."""
+    last = max(wanted) if wanted else None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for number, line in enumerate(f, 1):
+            if wanted is None or number in wanted:
+                yield number, line
+            if last is not None and number >= last:
+                return
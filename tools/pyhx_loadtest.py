@@ -0,0 +1,95 @@
+# PyHx/tools/pyhx_loadtest.py
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+# Must match INPUT_MARK / SECRET_MARK in main.py
+MARKS = (b'\x1f', b'\x1e')
+
+async def read_prompt(reader):
+    """Reads server output up to and including the next prompt marker."""
+    data = b''
+    while not any(mark in data for mark in MARKS):
+        chunk = await reader.read(65536)
+        if not chunk:
+            raise ConnectionError("server closed the session")
+        data += chunk
+    return data.decode('utf-8', 'replace')
+
+async def open_session(options):
+    """Connects and logs in, returning (reader, writer) at the shell prompt."""
+    if options.unix:
+        reader, writer = await asyncio.open_unix_connection(options.unix)
+    else:
+        reader, writer = await asyncio.open_connection(options.host, options.port)
+    menu = await read_prompt(reader)
+    number = None
+    for line in menu.splitlines():
+        entry = line.strip().split('. ', 1)
+        if len(entry) == 2 and entry[1] == options.user:
+            number = entry[0]
+    if number is None:
+        raise RuntimeError(f"user '{options.user}' not offered by the server")
+    writer.write(f"{number}\n".encode())
+    await read_prompt(reader)
+    writer.write(f"{options.password}\n".encode())
+    greeting = await read_prompt(reader)
+    if "Login successful" not in greeting:
+        raise RuntimeError("login failed")
+    return reader, writer
+
+async def active_session(options, latencies):
+    """Runs the command mix repeatedly, recording per-command latency."""
+    reader, writer = await open_session(options)
+    for i in range(options.commands):
+        command = options.mix[i % len(options.mix)]
+        start = time.perf_counter()
+        writer.write(f"{command}\n".encode())
+        await read_prompt(reader)
+        latencies.append(time.perf_counter() - start)
+    writer.write(b"shutdown\n")
+    writer.close()
+
+async def run_load(options):
+    print(f"Opening {options.idle} idle sessions...")
+    start = time.perf_counter()
+    idle = [await open_session(options) for _ in range(options.idle)]
+    print(f"  done in {time.perf_counter() - start:.2f}s")
+
+    print(f"Running {options.active} active sessions x {options.commands} commands...")
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(active_session(options, latencies) for _ in range(options.active)))
+    elapsed = time.perf_counter() - start
+
+    for _, writer in idle:
+        writer.close()
+    if not latencies:
+        return
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    print(f"  {len(latencies)} commands in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} cmd/s)")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"p95 {p95 * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test a PyHx server ('main.py --serve').")
+    parser.add_argument('--unix', metavar='PATH', help="Unix domain socket of the server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='root')
+    parser.add_argument('--idle', type=int, default=200, help="Sessions that log in and stay idle.")
+    parser.add_argument('--active', type=int, default=30, help="Sessions that run commands concurrently.")
+    parser.add_argument('--commands', type=int, default=100, help="Commands per active session.")
+    parser.add_argument('--mix', nargs='+', default=['whoami', 'whereami', 'calc 6*7', 'look', 'history'],
+                        help="Commands cycled through by active sessions.")
+    options = parser.parse_args()
+    try:
+        asyncio.run(run_load(options))
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
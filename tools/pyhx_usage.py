@@ -0,0 +1,116 @@
+# PyHx/tools/pyhx_usage.py
+
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SCAN_WORKERS = 32        # Directory listings are I/O bound, so use plenty of threads
+
+_CACHE_LOCK = threading.Lock()   # Server sessions may run 'usage' at the same time
+
+def format_size(num_bytes):
+    """Formats a byte count for humans, e.g. 1536 -> '1.5 KB'."""
+    size = float(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def load_cache(cache_path):
+    """Loads the directory cache: {path: [mtime_ns, file bytes, file count, [subdir names]]}."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache_path, cache):
+    """Writes the cache atomically through a temporary file of its own."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _scan_dir(path, cached):
+    """
+    Sums the files directly inside one directory and lists its subdirectories.
+
+    A directory's mtime changes whenever entries are added, removed or
+    renamed in it, so a cached result with the same mtime is reused as is.
+    A file that grows or shrinks in place leaves its directory's mtime
+    alone, so that change is missed until the next rescan.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    if cached and len(cached) == 4 and cached[0] == mtime:
+        return cached
+    total = count = 0
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+                    count += 1
+            except OSError:
+                continue
+    return [mtime, total, count, subdirs]
+
+def scan_tree(root, cache, workers=SCAN_WORKERS):
+    """
+    Walks root with a thread pool, one task per directory, and returns
+    {path: [mtime_ns, file bytes, file count, subdirs]} for the whole tree.
+    Unreadable directories are left out.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, root, cache.get(root)): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    info = future.result()
+                except OSError:
+                    continue
+                results[path] = info
+                for name in info[3]:
+                    child = os.path.join(path, name)
+                    pending[pool.submit(_scan_dir, child, cache.get(child))] = child
+    return results
+
+def tree_totals(tree):
+    """Returns {path: (total bytes, total files)} including everything below each directory."""
+    totals = {path: [info[1], info[2]] for path, info in tree.items()}
+    # Deepest directories first, so each child is complete before it is added to its parent
+    for path in sorted(tree, key=lambda p: p.count(os.sep), reverse=True):
+        parent = os.path.dirname(path)
+        if parent in totals and parent != path:
+            totals[parent][0] += totals[path][0]
+            totals[parent][1] += totals[path][1]
+    return totals
+
+def disk_usage(root, cache_path, workers=SCAN_WORKERS, rescan=False):
+    """
+    Scans root and returns {path: (bytes, files)}. Unchanged directories
+    reuse their cached totals unless rescan is set, which re-reads every
+    file size; the cache is refreshed either way.
+    """
+    root = os.path.abspath(root)
+    tree = scan_tree(root, {} if rescan else load_cache(cache_path), workers)
+    prefix = root.rstrip(os.sep) + os.sep
+    with _CACHE_LOCK:
+        cache = load_cache(cache_path)  # Reloaded, so a scan finished meanwhile isn't lost
+        for path in [p for p in cache if p == root or p.startswith(prefix)]:
+            if path not in tree:
+                del cache[path]  # Directory no longer exists
+        cache.update(tree)
+        save_cache(cache_path, cache)
+    return tree_totals(tree)
@@ -0,0 +1,395 @@
+# PyHx/tools/pyhx_vfs.py
+
+import io
+import os
+import time
+import errno
+import shutil
+import posixpath
+import threading
+import contextlib
+
+# Files up to this size are stored inline in their node row; larger files are
+# split into chunks of this size so they can be streamed.
+CHUNK_SIZE = 256 * 1024
+ROOT_ID = 1
+PATH_CACHE_LIMIT = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id     INTEGER PRIMARY KEY,
+    parent INTEGER NOT NULL,
+    name   TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size   INTEGER NOT NULL DEFAULT 0,
+    mtime  REAL NOT NULL,
+    data   BLOB,
+    UNIQUE (parent, name)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    node INTEGER NOT NULL,
+    seq  INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (node, seq)
+) WITHOUT ROWID;
+"""
+
+def _error(cls, code, path):
+    """Builds an OSError subclass the same way the os module does."""
+    return cls(code, os.strerror(code), path)
+
+class FileSystem:
+    """
+    Interface the file commands use to reach a user's files.
+
+    Relative paths are resolved against getcwd(). Failures raise the same
+    OSError subclasses as the os module (FileNotFoundError, FileExistsError,
+    IsADirectoryError, ...) so callers handle both backends identically.
+    """
+
+    def getcwd(self):
+        raise NotImplementedError
+
+    def chdir(self, path):
+        raise NotImplementedError
+
+    def entries(self, path):
+        """Returns a list of (name, is_dir) tuples for a directory."""
+        raise NotImplementedError
+
+    def isdir(self, path):
+        raise NotImplementedError
+
+    def exists(self, path):
+        raise NotImplementedError
+
+    def makedirs(self, path):
+        raise NotImplementedError
+
+    def touch(self, path):
+        raise NotImplementedError
+
+    def open(self, path, mode='r', encoding='utf-8'):
+        """Opens a file in 'r', 'w', 'a' or their binary ('b') variants."""
+        raise NotImplementedError
+
+    def remove(self, path):
+        raise NotImplementedError
+
+    def rmdir(self, path):
+        raise NotImplementedError
+
+    def copy(self, src, dst):
+        raise NotImplementedError
+
+    def move(self, src, dst):
+        raise NotImplementedError
+
+    def batch(self):
+        """Groups several operations so they apply together or not at all."""
+        return contextlib.nullcontext(self)
+
+    def close(self):
+        pass
+
+class _ChunkReader(io.RawIOBase):
+    """Streams a file's content from its inline blob or its chunk rows."""
+
+    def __init__(self, fs, node_id, inline):
+        self._fs = fs
+        self._node_id = node_id
+        self._pending = memoryview(inline if inline is not None else b'')
+        self._next_seq = None if inline is not None else 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and self._next_seq is not None:
+            chunk = self._fs._chunk(self._node_id, self._next_seq)
+            if chunk is None:
+                self._next_seq = None
+            else:
+                self._pending = memoryview(chunk)
+                self._next_seq += 1
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+class _BlobWriter(io.BytesIO):
+    """Collects written bytes and stores them in the container on close."""
+
+    def __init__(self, fs, path, append):
+        super().__init__()
+        self._fs = fs
+        self._path = path
+        self._append = append
+
+    def close(self):
+        if not self.closed:
+            self._fs._store(self._path, self.getvalue(), self._append)
+        super().close()
+
+class SqliteFS(FileSystem):
+    """
+    A sandboxed home directory kept in a single SQLite container file.
+
+    Nodes are looked up one path component at a time through the
+    (parent, name) index, with resolved paths cached. The cache is dropped
+    whenever another connection (e.g. a second session of the same user)
+    has committed, as reported by PRAGMA data_version. Small files live
+    inline in their row; large ones are split into CHUNK_SIZE blobs.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.cwd = '/'
+        import sqlite3  # Deferred: main.py imports this module for FileSystem on every start
+        self._db = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._ids = {}
+        self._version = None
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.execute("INSERT OR IGNORE INTO nodes (id, parent, name, is_dir, mtime) VALUES (?, 0, '', 1, ?)",
+                         (ROOT_ID, time.time()))
+
+    # --- Internal helpers ---
+    def _abs(self, path):
+        """Normalises a user path to an absolute container path."""
+        path = posixpath.normpath(posixpath.join(self.cwd, path.replace('\\', '/')))
+        return '/' + path.lstrip('/')
+
+    def _node(self, path):
+        """Returns (id, is_dir) for an absolute path, or None if it does not exist."""
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._ids.clear()  # Another connection changed the container
+            self._version = version
+        return self._lookup(path)
+
+    def _lookup(self, path):
+        if path == '/':
+            return (ROOT_ID, True)
+        node = self._ids.get(path)
+        if node is None:
+            parent_path, name = posixpath.split(path)
+            parent = self._lookup(parent_path)
+            if parent is None or not parent[1]:
+                return None
+            row = self._db.execute("SELECT id, is_dir FROM nodes WHERE parent = ? AND name = ?",
+                                   (parent[0], name)).fetchone()
+            if row is None:
+                return None
+            if len(self._ids) >= PATH_CACHE_LIMIT:
+                self._ids.clear()
+            node = self._ids[path] = (row[0], bool(row[1]))
+        return node
+
+    def _require(self, path, is_dir=None):
+        """Like _node, but raises the matching OSError when the node is missing or the wrong type."""
+        node = self._node(path)
+        if node is None:
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        if is_dir is True and not node[1]:
+            raise _error(NotADirectoryError, errno.ENOTDIR, path)
+        if is_dir is False and node[1]:
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        return node
+
+    def _new_slot(self, path):
+        """Returns (parent_id, name) for a node about to be created at path."""
+        if path == '/':
+            raise _error(FileExistsError, errno.EEXIST, path)
+        parent_path, name = posixpath.split(path)
+        parent_id = self._require(parent_path, is_dir=True)[0]
+        return parent_id, name
+
+    def _chunk(self, node_id, seq):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM chunks WHERE node = ? AND seq = ?", (node_id, seq)).fetchone()
+        return row[0] if row else None
+
+    def _content(self, node_id):
+        row = self._db.execute("SELECT data FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        if row[0] is not None:
+            return bytes(row[0])
+        return b''.join(r[0] for r in self._db.execute("SELECT data FROM chunks WHERE node = ? ORDER BY seq", (node_id,)))
+
+    def _store(self, path, data, append):
+        """Creates or overwrites (or appends to) the file at path."""
+        with self.batch():
+            node = self._node(path)
+            if node is not None:
+                if node[1]:
+                    raise _error(IsADirectoryError, errno.EISDIR, path)
+                if append:
+                    data = self._content(node[0]) + data
+            inline = data if len(data) <= CHUNK_SIZE else None
+            if node is None:
+                parent_id, name = self._new_slot(path)
+                node_id = self._db.execute("INSERT INTO nodes (parent, name, is_dir, size, mtime, data) "
+                                           "VALUES (?, ?, 0, ?, ?, ?)",
+                                           (parent_id, name, len(data), time.time(), inline)).lastrowid
+                self._ids[path] = (node_id, False)
+            else:
+                node_id = node[0]
+                self._db.execute("DELETE FROM chunks WHERE node = ?", (node_id,))
+                self._db.execute("UPDATE nodes SET data = ?, size = ?, mtime = ? WHERE id = ?",
+                                 (inline, len(data), time.time(), node_id))
+            if inline is None:
+                self._db.executemany("INSERT INTO chunks (node, seq, data) VALUES (?, ?, ?)",
+                                     ((node_id, i // CHUNK_SIZE, data[i:i + CHUNK_SIZE])
+                                      for i in range(0, len(data), CHUNK_SIZE)))
+
+    def _delete_node(self, node_id):
+        self._db.execute("DELETE FROM chunks WHERE node = ?", (node_id,))
+        self._db.execute("DELETE FROM nodes WHERE id = ?", (node_id,))
+        self._ids.clear()
+
+    # --- FileSystem interface ---
+    @contextlib.contextmanager
+    def batch(self):
+        with self._lock:
+            if self._depth == 0:
+                self._db.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._db.execute("ROLLBACK")
+                    self._ids.clear()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._db.execute("COMMIT")
+
+    def getcwd(self):
+        return self.cwd
+
+    def chdir(self, path):
+        path = self._abs(path)
+        with self._lock:
+            self._require(path, is_dir=True)
+        self.cwd = path
+
+    def entries(self, path='.'):
+        path = self._abs(path)
+        with self._lock:
+            node_id = self._require(path, is_dir=True)[0]
+            rows = self._db.execute("SELECT name, is_dir FROM nodes WHERE parent = ?", (node_id,)).fetchall()
+        return [(name, bool(is_dir)) for name, is_dir in rows]
+
+    def isdir(self, path):
+        with self._lock:
+            node = self._node(self._abs(path))
+        return bool(node and node[1])
+
+    def exists(self, path):
+        with self._lock:
+            return self._node(self._abs(path)) is not None
+
+    def makedirs(self, path):
+        path = self._abs(path)
+        with self.batch():
+            if self._node(path) is not None:
+                raise _error(FileExistsError, errno.EEXIST, path)
+            parent_path = posixpath.dirname(path)
+            if not self.isdir(parent_path):
+                self.makedirs(parent_path)
+            parent_id, name = self._new_slot(path)
+            self._db.execute("INSERT INTO nodes (parent, name, is_dir, mtime) VALUES (?, ?, 1, ?)",
+                             (parent_id, name, time.time()))
+
+    def touch(self, path):
+        path = self._abs(path)
+        with self.batch():
+            node = self._node(path)
+            if node is None:
+                self._store(path, b'', append=False)
+            else:
+                self._db.execute("UPDATE nodes SET mtime = ? WHERE id = ?", (time.time(), node[0]))
+
+    def open(self, path, mode='r', encoding='utf-8'):
+        path = self._abs(path)
+        kind = mode.replace('b', '')
+        if kind == 'r':
+            with self._lock:
+                node_id = self._require(path, is_dir=False)[0]
+                row = self._db.execute("SELECT data FROM nodes WHERE id = ?", (node_id,)).fetchone()
+            stream = io.BufferedReader(_ChunkReader(self, node_id, None if row[0] is None else bytes(row[0])))
+        elif kind in ('w', 'a'):
+            with self._lock:
+                node = self._node(path)
+                if node is None:
+                    self._new_slot(path)  # Fail now, not on close, if the parent is missing
+                elif node[1]:
+                    raise _error(IsADirectoryError, errno.EISDIR, path)
+            stream = _BlobWriter(self, path, append=(kind == 'a'))
+        else:
+            raise ValueError(f"unsupported mode '{mode}'")
+        return stream if 'b' in mode else io.TextIOWrapper(stream, encoding=encoding)
+
+    def remove(self, path):
+        path = self._abs(path)
+        with self.batch():
+            self._delete_node(self._require(path, is_dir=False)[0])
+
+    def rmdir(self, path):
+        path = self._abs(path)
+        with self.batch():
+            node_id = self._require(path, is_dir=True)[0]
+            if node_id == ROOT_ID:
+                raise _error(PermissionError, errno.EBUSY, path)
+            if self._db.execute("SELECT 1 FROM nodes WHERE parent = ? LIMIT 1", (node_id,)).fetchone():
+                raise _error(OSError, errno.ENOTEMPTY, path)
+            self._delete_node(node_id)
+
+    def copy(self, src, dst):
+        src, dst = self._abs(src), self._abs(dst)
+        with self.batch():
+            src_id = self._require(src, is_dir=False)[0]
+            if self.isdir(dst):
+                dst = posixpath.join(dst, posixpath.basename(src))
+            existing = self._node(dst)
+            if existing is not None and existing[0] == src_id:
+                raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+            self._store(dst, b'', append=False)
+            dst_id = self._node(dst)[0]
+            # Copy content inside SQLite so large files never pass through Python
+            self._db.execute("UPDATE nodes SET data = (SELECT data FROM nodes WHERE id = ?), "
+                             "size = (SELECT size FROM nodes WHERE id = ?) WHERE id = ?", (src_id, src_id, dst_id))
+            self._db.execute("INSERT INTO chunks (node, seq, data) SELECT ?, seq, data FROM chunks WHERE node = ?",
+                             (dst_id, src_id))
+
+    def move(self, src, dst):
+        src, dst = self._abs(src), self._abs(dst)
+        with self.batch():
+            src_id, src_is_dir = self._require(src)
+            if src_id == ROOT_ID:
+                raise _error(PermissionError, errno.EBUSY, src)
+            if self.isdir(dst):
+                dst = posixpath.join(dst, posixpath.basename(src))
+            if dst == src:
+                return
+            if src_is_dir and (dst + '/').startswith(src + '/'):
+                raise _error(OSError, errno.EINVAL, dst)
+            existing = self._node(dst)
+            if existing is not None:
+                if existing[1] or src_is_dir:
+                    raise _error(FileExistsError, errno.EEXIST, dst)
+                self._delete_node(existing[0])
+            parent_id, name = self._new_slot(dst)
+            self._db.execute("UPDATE nodes SET parent = ?, name = ?, mtime = ? WHERE id = ?",
+                             (parent_id, name, time.time(), src_id))
+            self._ids.clear()
+
+    def close(self):
+        with self._lock:
+            self._db.close()